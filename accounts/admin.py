@@ -29,4 +29,5 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'token', 'created_at', 'is_used')
     list_filter = ('is_used', 'created_at')
     search_fields = ('user__username', 'token')
+    list_select_related = ('user',)
     readonly_fields = ('created_at',)
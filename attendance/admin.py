@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import Attendance, WageSummary, MpesaPayout
 
 @admin.register(Attendance)
@@ -8,6 +9,7 @@ class AttendanceAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     readonly_fields = ('total_hours', 'wage_earned')
     date_hierarchy = 'date'
+    list_select_related = ('user',)
 
 @admin.register(WageSummary)
 class WageSummaryAdmin(admin.ModelAdmin):
@@ -15,6 +17,13 @@ class WageSummaryAdmin(admin.ModelAdmin):
     list_filter = ('year', 'month', 'is_paid', 'user__role')
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     readonly_fields = ('total_hours', 'total_wage')
+    list_select_related = ('user',)
+    actions = ['mark_paid']
+    
+    def mark_paid(self, request, queryset):
+        updated = queryset.filter(is_paid=False).update(is_paid=True, paid_date=timezone.now())
+        self.message_user(request, f'Marked {updated} wage summary(ies) as paid.')
+    mark_paid.short_description = 'Mark selected wage summaries as paid'
 
 
 @admin.register(MpesaPayout)
@@ -27,6 +36,7 @@ class MpesaPayoutAdmin(admin.ModelAdmin):
         'conversation_id', 'created_at',
     )
     list_filter = ('status', 'year', 'month')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'conversation_id', 'transaction_id', 'phone')
     readonly_fields = (
         'user', 'wage_summary', 'amount', 'phone', 'month', 'year',
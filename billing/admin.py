@@ -1,16 +1,25 @@
+from collections import Counter
 from django.contrib import admin
-from .models import Customer, Invoice, InvoiceItem, Payment, AccountsReceivable, AccountsPayable
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from supermarket.pagination import EstimatedCountPaginator
+from .models import Customer, Invoice, InvoiceItem, Payment, AccountsReceivable, AccountsPayable, DailySalesSummary
+from . import reservations
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'phone', 'created_at')
     search_fields = ('name', 'email', 'phone')
     list_filter = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 class InvoiceItemInline(admin.TabularInline):
     model = InvoiceItem
     extra = 1
-    readonly_fields = ('total_price',)
+    raw_id_fields = ('product',)
+    readonly_fields = ('sku', 'cost_price', 'total_price', 'reserved_quantity', 'lapsed_quantity')
 
 class PaymentInline(admin.TabularInline):
     model = Payment
@@ -22,24 +31,118 @@ class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('invoice_number', 'customer', 'staff_member', 'total_amount', 'payment_status', 'created_at')
     list_filter = ('payment_status', 'payment_method', 'created_at')
     search_fields = ('invoice_number', 'customer__name', 'staff_member__username')
-    readonly_fields = ('invoice_number', 'subtotal', 'tax_amount', 'total_amount')
+    # paid_amount only changes through payments (Payment rows / Invoice.apply_payment)
+    readonly_fields = ('invoice_number', 'subtotal', 'tax_amount', 'total_amount', 'paid_amount')
     inlines = [InvoiceItemInline, PaymentInline]
-    date_hierarchy = 'created_at'
+    list_select_related = ('customer', 'staff_member')
+    # No date_hierarchy: it runs a DISTINCT over every row's date on each page view;
+    # the created_at filter covers the same ground from the (created_at, id) index.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['mark_paid']
+    
+    @transaction.atomic
+    def mark_paid(self, request, queryset):
+        # One Payment per invoice for its outstanding balance, then one UPDATE for all of them
+        unpaid = queryset.exclude(payment_status__in=['paid', 'cancelled']).filter(total_amount__gt=0)
+        rows = list(unpaid.select_for_update().values_list(
+            'id', 'created_at', 'total_amount', 'paid_amount', 'payment_status', 'payment_method',
+        ))
+        if not rows:
+            self.message_user(request, 'No unpaid invoices were selected.')
+            return
+        Payment.objects.bulk_create([
+            Payment(
+                invoice_id=pk,
+                amount=total - paid,
+                payment_method=method or 'cash',
+                notes=f'Marked paid by {request.user.username}',
+            )
+            for pk, _created, total, paid, _status, method in rows
+            if total > paid
+        ], batch_size=500)
+        unpaid.update(paid_amount=F('total_amount'), payment_status='paid')
+        # Held stock leaves the shelf now that the invoices are paid
+        reservations.release_invoices([row[0] for row in rows], sold=True, user=request.user)
+        
+        # Keep the per-day pending/overdue counters in step, as Invoice.save would
+        pending, overdue = Counter(), Counter()
+        for _pk, created, _total, _paid, status, _method in rows:
+            day = timezone.localdate(created)
+            pending[day] += status == 'pending'
+            overdue[day] += status == 'overdue'
+        for day in pending.keys() | overdue.keys():
+            DailySalesSummary.apply_delta(day, pending_count=-pending[day], overdue_count=-overdue[day])
+        self.message_user(request, f'Marked {len(rows)} invoice(s) as paid.')
+    mark_paid.short_description = 'Mark selected invoices as paid'
+    
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not InvoiceItem:
+            return super().save_formset(request, form, formset, change)
+        
+        # Write the inline rows in bulk and recompute the invoice totals once,
+        # rather than letting every InvoiceItem.save() re-sum the invoice.
+        invoice = form.instance
+        with transaction.atomic():
+            instances = formset.save(commit=False)
+            deleted_ids = [obj.pk for obj in formset.deleted_objects]
+            if deleted_ids:
+                InvoiceItem.objects.filter(pk__in=deleted_ids).delete()
+            
+            changed = [obj for obj in instances if obj.pk is not None]
+            for obj in changed:
+                obj.snapshot_product()
+                obj.total_price = obj.quantity * obj.unit_price
+            if changed:
+                # The product or quantity may have changed: drop the old holds and reserve afresh.
+                # Staff editing in the admin may oversell; the till views may not.
+                reservations.release_items([obj.pk for obj in changed])
+                for obj in changed:
+                    obj.reserved_quantity, obj.reserved_until = 0, None
+                reservations.hold(invoice, changed, allow_oversell=True)
+                InvoiceItem.objects.bulk_update(
+                    changed,
+                    ['product', 'description', 'sku', 'cost_price', 'quantity', 'unit_price', 'total_price',
+                     'reserved_quantity', 'reserved_until'],
+                )
+            
+            invoice.add_items([obj for obj in instances if obj.pk is None], allow_oversell=True)
+            formset.save_m2m()
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('invoice', 'amount', 'payment_method', 'payment_date')
     list_filter = ('payment_method', 'payment_date')
     search_fields = ('invoice__invoice_number', 'transaction_id')
+    # Invoice.__str__ reads the customer too
+    list_select_related = ('invoice__customer',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(AccountsReceivable)
 class AccountsReceivableAdmin(admin.ModelAdmin):
     list_display = ('customer', 'invoice', 'amount_due', 'due_date', 'is_settled')
     list_filter = ('is_settled', 'due_date')
     search_fields = ('customer__name', 'invoice__invoice_number')
+    list_select_related = ('customer', 'invoice__customer')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(AccountsPayable)
 class AccountsPayableAdmin(admin.ModelAdmin):
     list_display = ('staff_member', 'description', 'amount_due', 'due_date', 'is_paid')
     list_filter = ('is_paid', 'due_date')
     search_fields = ('staff_member__username', 'description')
+    list_select_related = ('staff_member',)
+    actions = ['mark_paid']
+    
+    def mark_paid(self, request, queryset):
+        updated = queryset.filter(is_paid=False).update(is_paid=True, paid_date=timezone.now())
+        self.message_user(request, f'Marked {updated} payable(s) as paid.')
+    mark_paid.short_description = 'Mark selected payables as paid'
+
+@admin.register(DailySalesSummary)
+class DailySalesSummaryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'sales_total', 'invoice_count', 'pending_count', 'overdue_count', 'updated_at')
+    readonly_fields = ('date', 'sales_total', 'invoice_count', 'pending_count', 'overdue_count', 'updated_at')
+    date_hierarchy = 'date'
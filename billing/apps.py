@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.db.models.signals import pre_delete
+
+def _invoice_deleting(sender, instance, **kwargs):
+    instance.forget_daily_summary()
+
+def _invoice_item_deleting(sender, instance, **kwargs):
+    from . import reservations
+    
+    reservations.release_items([instance.pk])
+
+class BillingConfig(AppConfig):
+    name = 'billing'
+    
+    def ready(self):
+        # Receivers rather than delete() overrides: queryset deletes (the admin's "delete selected")
+        # and cascades from a deleted invoice or customer never call Model.delete
+        pre_delete.connect(_invoice_deleting, sender='billing.Invoice')
+        pre_delete.connect(_invoice_item_deleting, sender='billing.InvoiceItem')
@@ -0,0 +1,182 @@
+"""Single-request POS checkout: invoice, line items, payments and stock in one transaction."""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inventory import prices
+from inventory import stock as stock_ledger
+from inventory.models import StockMovement
+
+from .models import Customer, Invoice, InvoiceItem, Payment
+
+_PAYMENT_METHODS = {code for code, _label in Payment.PAYMENT_METHOD_CHOICES}
+
+# Baskets that are not settled at the till are due a week later unless the client says otherwise.
+DEFAULT_DUE_DAYS = 7
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def _decimal(value, field):
+    try:
+        result = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise CheckoutError(f'{field} must be a number.')
+    if not result.is_finite():
+        raise CheckoutError(f'{field} must be a number.')
+    return result
+
+
+def _due_date(value):
+    if not value:
+        return timezone.now() + timedelta(days=DEFAULT_DUE_DAYS)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise CheckoutError('due_date must be an ISO 8601 datetime.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _customer(value):
+    if not value:
+        return None
+    # A JSON id only: not a bool, list or object, and no floats rounded down to someone else's id
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise CheckoutError('customer_id must be an integer.')
+    try:
+        pk = int(value)
+    except ValueError:
+        raise CheckoutError('customer_id must be an integer.')
+    # Outside the BIGINT id column's range the database driver raises rather than matching nothing
+    customer = Customer.objects.filter(pk=pk).first() if 0 < pk < 2 ** 63 else None
+    if customer is None:
+        raise CheckoutError('Unknown customer_id.')
+    return customer
+
+
+def _build_items(lines):
+    if not isinstance(lines, list) or not lines:
+        raise CheckoutError('items must be a non-empty list.')
+
+    codes = [line for line in lines if isinstance(line, dict)]
+    by_sku, by_barcode = prices.lookup(
+        prices.current(),
+        skus={str(line['sku']) for line in codes if line.get('sku')},
+        barcodes={str(line['barcode']) for line in codes if line.get('barcode') and not line.get('sku')},
+    )
+
+    items = []
+    stock = defaultdict(int)
+    for index, line in enumerate(lines):
+        if not isinstance(line, dict):
+            raise CheckoutError(f'items[{index}] must be an object.')
+        quantity = _decimal(line.get('quantity', 1), f'items[{index}].quantity')
+        if quantity <= 0:
+            raise CheckoutError(f'items[{index}].quantity must be positive.')
+
+        sku, barcode = line.get('sku'), line.get('barcode')
+        if sku or barcode:
+            entry = by_sku.get(str(sku)) if sku else by_barcode.get(str(barcode))
+            if entry is None:
+                raise CheckoutError(f"items[{index}]: unknown or inactive {'SKU' if sku else 'barcode'} {sku or barcode}.")
+            if quantity != quantity.to_integral_value():
+                raise CheckoutError(f'items[{index}].quantity must be a whole number for stocked products.')
+            if 'unit_price' in line:
+                raise CheckoutError(f'items[{index}]: stocked products are sold at their catalogue price.')
+            description = line.get('description') or entry.name
+            unit_price = entry.unit_price
+            stock[entry.product_id] += int(quantity)
+        else:
+            entry = None
+            description = line.get('description')
+            if not description or 'unit_price' not in line:
+                raise CheckoutError(f'items[{index}] needs a sku or barcode, or a description and unit_price.')
+            unit_price = _decimal(line['unit_price'], f'items[{index}].unit_price')
+        if unit_price < 0:
+            raise CheckoutError(f'items[{index}].unit_price cannot be negative.')
+
+        items.append(InvoiceItem(
+            product_id=entry.product_id if entry else None,
+            sku=entry.sku if entry else '',
+            cost_price=entry.cost_price if entry else None,
+            description=str(description)[:200],
+            quantity=quantity,
+            unit_price=unit_price,
+        ))
+    return items, stock
+
+
+def _build_payments(entries):
+    if entries is None:
+        return []
+    if not isinstance(entries, list):
+        raise CheckoutError('payments must be a list.')
+    payments = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise CheckoutError(f'payments[{index}] must be an object.')
+        amount = _decimal(entry.get('amount'), f'payments[{index}].amount')
+        if amount <= 0:
+            raise CheckoutError(f'payments[{index}].amount must be positive.')
+        method = entry.get('payment_method', 'cash')
+        if method not in _PAYMENT_METHODS:
+            raise CheckoutError(f'payments[{index}].payment_method is not supported.')
+        payments.append(Payment(
+            amount=amount,
+            payment_method=method,
+            transaction_id=str(entry.get('transaction_id', ''))[:100],
+            notes=str(entry.get('notes', '')),
+        ))
+    return payments
+
+
+def process_checkout(data, staff_member):
+    """Create an invoice for a whole basket with a fixed number of queries, whatever its size."""
+    if not isinstance(data, dict):
+        raise CheckoutError('Request body must be a JSON object.')
+    if 'tax_rate' in data:
+        raise CheckoutError('tax_rate is set by the server.')
+
+    items, stock = _build_items(data.get('items'))
+    payments = _build_payments(data.get('payments'))
+
+    discount = _decimal(data.get('discount_amount', 0), 'discount_amount')
+    subtotal = sum(item.quantity * item.unit_price for item in items)
+    if discount < 0 or discount > subtotal:
+        raise CheckoutError('discount_amount must be between 0 and the basket subtotal.')
+
+    customer = _customer(data.get('customer_id'))
+
+    invoice = Invoice(
+        customer=customer,
+        staff_member=staff_member,
+        due_date=_due_date(data.get('due_date')),
+        discount_amount=discount,
+        notes=str(data.get('notes', '')),
+    )
+    if payments:
+        invoice.payment_method = payments[0].payment_method
+
+    with transaction.atomic():
+        invoice.save()
+        # Stock leaves the shelf below, so the lines reserve nothing
+        invoice.add_items(items, reserve=False)
+        if payments:
+            for payment in payments:
+                payment.invoice = invoice
+            Payment.objects.bulk_create(payments)
+            invoice.apply_payment(sum(p.amount for p in payments))
+        # Last statement in the transaction, so product row locks are held as briefly as possible
+        stock_ledger.record_movements(
+            StockMovement.SALE, stock, reference=invoice.invoice_number, user=staff_member,
+        )
+    invoice.refresh_from_db()
+    return invoice
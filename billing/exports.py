@@ -0,0 +1,86 @@
+"""Streaming CSV / JSON-lines exports of invoices, line items and payments for accounting."""
+
+import csv
+import json
+from decimal import Decimal
+
+from .models import Invoice, InvoiceItem, Payment
+
+EXPORT_CHUNK_SIZE = 2000
+
+# dataset name -> (model, [(header, ORM lookup), ...])
+DATASETS = {
+    'invoices': (Invoice, [
+        ('invoice_number', 'invoice_number'),
+        ('created_at', 'created_at'),
+        ('due_date', 'due_date'),
+        ('customer', 'customer__name'),
+        ('staff_member', 'staff_member__username'),
+        ('subtotal', 'subtotal'),
+        ('tax_rate', 'tax_rate'),
+        ('tax_amount', 'tax_amount'),
+        ('discount_amount', 'discount_amount'),
+        ('total_amount', 'total_amount'),
+        ('paid_amount', 'paid_amount'),
+        ('payment_status', 'payment_status'),
+        ('payment_method', 'payment_method'),
+    ]),
+    'items': (InvoiceItem, [
+        ('invoice_number', 'invoice__invoice_number'),
+        ('invoice_date', 'invoice__created_at'),
+        ('description', 'description'),
+        ('quantity', 'quantity'),
+        ('unit_price', 'unit_price'),
+        ('total_price', 'total_price'),
+    ]),
+    'payments': (Payment, [
+        ('invoice_number', 'invoice__invoice_number'),
+        ('payment_date', 'payment_date'),
+        ('amount', 'amount'),
+        ('payment_method', 'payment_method'),
+        ('transaction_id', 'transaction_id'),
+    ]),
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(queryset, columns):
+    # Keyset batches on id rather than one big cursor: MySQL and SQLite drivers
+    # buffer a whole result set client-side even under .iterator().
+    lookups = [lookup for _header, lookup in columns]
+    queryset = queryset.order_by('id')
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).values_list('id', *lookups)[:EXPORT_CHUNK_SIZE])
+        for row in batch:
+            yield row[1:]
+        if len(batch) < EXPORT_CHUNK_SIZE:
+            return
+        last_id = batch[-1][0]
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(queryset, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _lookup in columns])
+    for row in _rows(queryset, columns):
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def stream_jsonl(queryset, columns):
+    headers = [header for header, _lookup in columns]
+    for row in _rows(queryset, columns):
+        yield json.dumps(dict(zip(headers, map(_plain, row)))) + '\n'
@@ -1,6 +1,26 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Invoice, InvoiceItem, Customer, Payment
 
+class CustomerSearchSelect(forms.Select):
+    """
+    Customer picker that only renders the selected customer; other options are
+    fetched from the customer_search endpoint as the cashier types.
+    """
+    class Media:
+        js = ('js/customer_search.js',)
+    
+    def __init__(self, attrs=None):
+        attrs = {'data-search-url': reverse_lazy('customer_search'), **(attrs or {})}
+        super().__init__(attrs)
+    
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v]
+        self.choices = [('', 'Walk-in Customer')] + [
+            (customer.pk, str(customer)) for customer in Customer.objects.filter(pk__in=selected)
+        ]
+        return super().optgroups(name, value, attrs)
+
 class CustomerForm(forms.ModelForm):
     class Meta:
         model = Customer
@@ -16,6 +36,7 @@ class InvoiceForm(forms.ModelForm):
         model = Invoice
         fields = ['customer', 'due_date', 'tax_rate', 'discount_amount', 'notes']
         widgets = {
+            'customer': CustomerSearchSelect(),
             'due_date': forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
             'notes': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
@@ -27,14 +48,47 @@ class InvoiceForm(forms.ModelForm):
                 field.widget.attrs['class'] = 'form-control'
 
 class InvoiceItemForm(forms.ModelForm):
+    # A stocked product's line reserves its units until the invoice is paid
+    product_sku = forms.CharField(
+        label='SKU', max_length=50, required=False,
+        help_text='Leave blank for a non-stock line; description and price default to the product\'s.',
+    )
+    
     class Meta:
         model = InvoiceItem
-        fields = ['description', 'quantity', 'unit_price']
+        fields = ['product_sku', 'description', 'quantity', 'unit_price']
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['description'].required = False
+        self.fields['unit_price'].required = False
         for field in self.fields.values():
             field.widget.attrs['class'] = 'form-control'
+    
+    def clean(self):
+        from inventory.models import Product
+        
+        cleaned_data = super().clean()
+        sku = cleaned_data.get('product_sku', '').strip()
+        if not sku:
+            if not cleaned_data.get('description'):
+                self.add_error('description', 'Enter a description or a product SKU.')
+            if cleaned_data.get('unit_price') is None:
+                self.add_error('unit_price', 'Enter a unit price or a product SKU.')
+            return cleaned_data
+        
+        product = Product.objects.active().filter(sku=sku).only('sku', 'name', 'unit_price', 'cost_price').first()
+        if product is None:
+            raise forms.ValidationError({'product_sku': f'No active product has SKU {sku}.'})
+        quantity = cleaned_data.get('quantity')
+        if quantity is not None and quantity != quantity.to_integral_value():
+            self.add_error('quantity', 'Stocked products are sold in whole units.')
+        self.instance.product = product
+        if not cleaned_data.get('description'):
+            cleaned_data['description'] = product.name
+        if cleaned_data.get('unit_price') is None:
+            cleaned_data['unit_price'] = product.unit_price
+        return cleaned_data
 
 class PaymentForm(forms.ModelForm):
     class Meta:
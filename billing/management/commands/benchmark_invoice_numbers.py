@@ -0,0 +1,40 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from billing.models import Invoice
+
+
+def _uuid_number():
+    # The scheme Invoice.save used before billing.sequences
+    return f"INV-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare invoice insert throughput with block-allocated sequence numbers against the old '
+        'random uuid4-suffix numbers. Inserted rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=5000, help='Invoices inserted per scheme (default: 5000).')
+
+    def handle(self, *args, **options):
+        count = options['invoices']
+        due = timezone.now() + timedelta(days=7)
+        for label, numbering in (('uuid4 suffix', _uuid_number), ('sequence block', None)):
+            with transaction.atomic():
+                staff = CustomUser.objects.create(username=f'invoice-benchmark-{time.time_ns()}')
+                started = time.perf_counter()
+                for _ in range(count):
+                    Invoice(
+                        invoice_number=numbering() if numbering else '', staff_member=staff, due_date=due,
+                    ).save()
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            self.stdout.write(f'{label:>14}: {count / elapsed:,.0f} inserts/s ({count} in {elapsed:.2f}s)')
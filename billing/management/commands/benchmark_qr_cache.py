@@ -0,0 +1,50 @@
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from billing import qr
+from billing.models import Invoice
+from supermarket.benchmarks import latency_summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure invoice QR code latency on a cache miss (render and write) and a hit, per format, '
+        'in a throwaway MEDIA_ROOT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=200, help='Distinct payloads timed per format (default: 200).')
+        parser.add_argument('--formats', nargs='+', choices=qr.QR_FORMATS, default=list(qr.QR_FORMATS))
+
+    def handle(self, *args, **options):
+        due = timezone.now() + timedelta(days=30)
+        # Unsaved invoices: only the fields the payload reads
+        payloads = [
+            qr.invoice_qr_payload(Invoice(
+                invoice_number=f'INV-BENCH-{n:06d}', total_amount=Decimal(n) + Decimal('0.99'), due_date=due,
+            ))
+            for n in range(options['invoices'])
+        ]
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, QR_CACHE_MAX_FILES=len(payloads) * len(options['formats']),
+        ):
+            for fmt in options['formats']:
+                misses = self._time(payloads, fmt)
+                hits = self._time(payloads, fmt)
+                for label, samples in (('miss', misses), ('hit', hits)):
+                    self.stdout.write(f'{fmt:>4} {label:>4}: {latency_summary(samples)}')
+
+    def _time(self, payloads, fmt):
+        timings = []
+        for payload in payloads:
+            started = time.perf_counter()
+            qr.get_qr_code_url(payload, fmt)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
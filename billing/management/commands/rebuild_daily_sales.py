@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from billing.models import DailySalesSummary, Invoice, rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailySalesSummary rollup from the invoice table.'
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_sales(Invoice.objects, DailySalesSummary.objects)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily sales summaries.'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from billing import reservations
+
+
+class Command(BaseCommand):
+    help = 'Give back the stock held by invoice lines whose reservation has expired (abandoned invoices; cron-safe).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=reservations.SWEEP_BATCH_SIZE,
+            help=f'Invoice lines locked and released per transaction (default: {reservations.SWEEP_BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        released = reservations.release_expired(batch_size=max(1, options['batch_size']))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {released} expired reservation(s) in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'id'], name='invoice_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['payment_status', 'created_at'], name='invoice_status_created_idx'),
+        ),
+    ]
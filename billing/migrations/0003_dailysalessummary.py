@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:30
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    from billing.models import rebuild_daily_sales
+
+    rebuild_daily_sales(
+        apps.get_model('billing', 'Invoice').objects, apps.get_model('billing', 'DailySalesSummary').objects,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_invoice_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('sales_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('overdue_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales summaries',
+                'db_table': 'daily_sales_summary',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
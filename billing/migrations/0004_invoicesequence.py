@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_dailysalessummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('next_value', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'invoice_sequence',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:33
+
+from django.db import migrations, models
+
+
+def populate_search_keys(apps, schema_editor):
+    from billing.models import normalize_phone
+
+    Customer = apps.get_model('billing', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('id', 'name', 'phone').iterator(chunk_size=2000):
+        customer.name_lower = customer.name.lower()
+        customer.phone_normalized = normalize_phone(customer.phone)
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['name_lower', 'phone_normalized'])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ['name_lower', 'phone_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_lower',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+    ]
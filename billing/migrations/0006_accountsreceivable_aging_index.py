@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_customer_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountsreceivable',
+            index=models.Index(fields=['is_settled', 'due_date'], name='ar_settled_due_idx'),
+        ),
+    ]
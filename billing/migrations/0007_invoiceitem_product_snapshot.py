@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('billing', '0006_accountsreceivable_aging_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='cost_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='product',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_items', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='sku',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['product', 'invoice'], name='invoice_item_product_idx'),
+        ),
+    ]
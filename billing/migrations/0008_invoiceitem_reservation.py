@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_invoiceitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['reserved_until'], name='invoice_item_reserved_idx'),
+        ),
+    ]
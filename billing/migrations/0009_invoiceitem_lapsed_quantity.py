@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_invoiceitem_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='lapsed_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
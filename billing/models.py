@@ -1,8 +1,26 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.utils import timezone
 from accounts.models import CustomUser
+from supermarket.cache import bump_cache_version
 from decimal import Decimal
-import uuid
+
+CUSTOMER_SEARCH_VERSION_KEY = 'billing:customer_search_version'
+
+# Inserts tried with a freshly allocated invoice number before a collision is raised
+INVOICE_NUMBER_ATTEMPTS = 3
+
+
+def normalize_phone(raw):
+    """Digits only, with Kenyan local numbers (07…, 7…) rewritten to 2547…."""
+    digits = ''.join(c for c in (raw or '') if c.isdigit())
+    if digits.startswith('0'):
+        return '254' + digits[1:]
+    if digits[:1] in ('1', '7') and len(digits) <= 9:
+        return '254' + digits
+    return digits
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -11,6 +29,16 @@ class Customer(models.Model):
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Denormalised search keys so till lookups are indexed prefix scans
+    name_lower = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    phone_normalized = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        self.name_lower = self.name.lower()
+        self.phone_normalized = normalize_phone(self.phone)
+        super().save(*args, **kwargs)
+        bump_cache_version(CUSTOMER_SEARCH_VERSION_KEY)
+    
     def __str__(self):
         return self.name
     
@@ -40,35 +68,189 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     due_date = models.DateTimeField()
     
-    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=8.25)  # Tax percentage
-    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('8.25'))  # Tax percentage
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_method = models.CharField(max_length=15, choices=PAYMENT_METHOD_CHOICES, blank=True)
-    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     
     notes = models.TextField(blank=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_payment_status = instance.__dict__.get('payment_status')
+        return instance
+    
+    def _lock_row(self, *fields):
+        """Lock this invoice's row until the transaction ends and return the committed ``fields``."""
+        rows = Invoice.objects.filter(pk=self.pk)
+        if not connection.features.has_select_for_update:
+            # SQLite has no row locks: a no-op UPDATE takes the database write lock before the read
+            rows.update(paid_amount=F('paid_amount'))
+        return rows.select_for_update().values_list(*fields).first()
+    
+    def _sync_daily_summary(self, previous, current, created=False, deleted=False):
+        """
+        Push the change from ``previous`` to ``current`` (committed (total_amount, payment_status)
+        pairs, None for no row) into this invoice's DailySalesSummary row.
+        """
+        if previous is None and not created:
+            return
+        old_total, old_status = previous or (Decimal('0.00'), None)
+        new_total, new_status = current or (Decimal('0.00'), None)
+        DailySalesSummary.apply_delta(
+            timezone.localdate(self.created_at),
+            sales_total=Decimal(new_total).quantize(Decimal('0.01')) - old_total,
+            invoice_count=int(created) - int(deleted),
+            pending_count=(new_status == 'pending') - (old_status == 'pending'),
+            overdue_count=(new_status == 'overdue') - (old_status == 'overdue'),
+        )
+    
+    @transaction.atomic
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            self.invoice_number = f"INV-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        created = self._state.adding
+        previous = None
+        
+        from . import sequences
+        
+        if not created:
+            # paid_amount only moves through apply_payment; this copy's value may be stale, so
+            # take the committed one and never write it back. The same locked read is what the
+            # daily rollup's delta is measured from.
+            committed = self._lock_row('paid_amount', 'payment_status', 'total_amount')
+            if committed is not None:
+                previous = (committed[2], committed[1])
+                self.paid_amount = committed[0]
+                # Keep the committed status unless this copy was deliberately changed (e.g. cancelled)
+                if self.payment_status == getattr(self, '_loaded_payment_status', self.payment_status):
+                    self.payment_status = committed[1]
+            fields = kwargs.get('update_fields')
+            if fields is None:
+                fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [name for name in fields if name != 'paid_amount']
+        
+        allocated_number = not self.invoice_number
+        if allocated_number:
+            self.invoice_number = sequences.next_invoice_number()
         
         # Calculate totals
         self.tax_amount = (self.subtotal * self.tax_rate) / 100
         self.total_amount = self.subtotal + self.tax_amount - self.discount_amount
         
         # Update payment status
-        if self.paid_amount >= self.total_amount:
-            self.payment_status = 'paid'
-        elif self.paid_amount > 0:
-            self.payment_status = 'partial'
-        elif self.due_date < timezone.now() and self.payment_status == 'pending':
-            self.payment_status = 'overdue'
+        if self.payment_status != 'cancelled':
+            if self.total_amount > 0 and self.paid_amount >= self.total_amount:
+                self.payment_status = 'paid'
+            elif self.paid_amount > 0:
+                self.payment_status = 'partial'
+            elif self.due_date < timezone.now():
+                self.payment_status = 'overdue'
+            else:
+                self.payment_status = 'pending'
         
-        super().save(*args, **kwargs)
+        if allocated_number:
+            for attempt in range(INVOICE_NUMBER_ATTEMPTS):
+                try:
+                    with transaction.atomic():
+                        super().save(*args, **kwargs)
+                    break
+                except IntegrityError:
+                    if attempt == INVOICE_NUMBER_ATTEMPTS - 1:
+                        raise
+                    # The number is already taken (e.g. a block was handed out twice); take a fresh block
+                    sequences.discard_blocks()
+                    self.invoice_number = sequences.next_invoice_number()
+        else:
+            super().save(*args, **kwargs)
+        self._loaded_payment_status = self.payment_status
+        if created:
+            current = (self.total_amount, self.payment_status)
+        else:
+            written = kwargs['update_fields']
+            current = (
+                self.total_amount if 'total_amount' in written or previous is None else previous[0],
+                self.payment_status if 'payment_status' in written or previous is None else previous[1],
+            )
+        self._sync_daily_summary(previous, current, created=created)
+        self._settle_reservations(previous)
+    
+    def _settle_reservations(self, previous):
+        """End the stock holds of an invoice that just became paid (sold) or cancelled (released)."""
+        old_status = previous[1] if previous else None
+        if self.payment_status == old_status or self.payment_status not in ('paid', 'cancelled'):
+            return
+        from . import reservations
+        
+        reservations.release_invoices([self.pk], sold=self.payment_status == 'paid')
+    
+    def forget_daily_summary(self):
+        """Take this invoice out of the daily rollup; pre_delete (billing.apps) calls it on every delete path."""
+        previous = self._lock_row('total_amount', 'payment_status')
+        self._sync_daily_summary(previous, None, deleted=True)
+    
+    def recalculate_totals(self):
+        """Refresh subtotal/tax/total from the line items with a single SUM() query."""
+        self.subtotal = self.items.aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
+        self.save(update_fields=['subtotal', 'tax_amount', 'total_amount', 'payment_status'])
+    
+    @transaction.atomic
+    def add_items(self, items, reserve=True, allow_oversell=False):
+        """
+        Insert unsaved InvoiceItem rows with one bulk_create and recompute the
+        invoice totals once, instead of once per item as InvoiceItem.save does.
+        
+        Product lines reserve their stock until the invoice is paid (see
+        billing.reservations), or are sold at once on an invoice that already
+        is; raises InsufficientStock, adding nothing, when
+        the stock is not available unless ``allow_oversell``. Pass
+        ``reserve=False`` when the caller takes the stock itself.
+        """
+        items = list(items)
+        for item in items:
+            item.invoice = self
+            item.snapshot_product()
+            item.total_price = item.quantity * item.unit_price
+        if reserve:
+            from . import reservations
+            
+            if self.payment_status == 'paid':
+                # Its other lines left the shelf when it was paid, so these are sold straight away
+                # rather than held
+                reservations.sell(self, items)
+            else:
+                reservations.hold(self, items, allow_oversell=allow_oversell)
+        if items:
+            items = InvoiceItem.objects.bulk_create(items)
+        self.recalculate_totals()
+        return items
+    
+    @transaction.atomic
+    def apply_payment(self, amount):
+        """
+        Add ``amount`` (negative to reverse) to paid_amount and recompute
+        payment_status in the same UPDATE, so concurrent tills never lose a payment.
+        """
+        previous = self._lock_row('total_amount', 'payment_status')
+        new_paid = F('paid_amount') + Value(amount)
+        Invoice.objects.filter(pk=self.pk).update(
+            paid_amount=new_paid,
+            payment_status=Case(
+                When(payment_status='cancelled', then=F('payment_status')),
+                When(GreaterThanOrEqual(new_paid, F('total_amount')), total_amount__gt=0, then=Value('paid')),
+                When(GreaterThan(new_paid, 0), then=Value('partial')),
+                When(due_date__lt=timezone.now(), then=Value('overdue')),
+                default=Value('pending'),
+            ),
+        )
+        self.refresh_from_db(fields=['paid_amount', 'payment_status'])
+        self._loaded_payment_status = self.payment_status
+        self._sync_daily_summary(previous, previous and (previous[0], self.payment_status))
+        self._settle_reservations(previous)
     
     def __str__(self):
         return f"{self.invoice_number} - {self.customer.name if self.customer else 'Walk-in Customer'}"
@@ -76,27 +258,151 @@ class Invoice(models.Model):
     class Meta:
         db_table = 'invoice'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='invoice_created_id_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='invoice_status_created_idx'),
+        ]
+
+class DailySalesSummary(models.Model):
+    """Per-day sales rollup kept current by Invoice saves; rebuild with `rebuild_daily_sales`."""
+    date = models.DateField(unique=True)
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    invoice_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    overdue_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @classmethod
+    def apply_delta(cls, day, sales_total=0, invoice_count=0, pending_count=0, overdue_count=0):
+        """
+        Add the deltas to ``day``'s row once the surrounding transaction commits, so the row is
+        locked for that one UPDATE rather than for the whole of every till's checkout.
+        """
+        if not (sales_total or invoice_count or pending_count or overdue_count):
+            return
+        transaction.on_commit(lambda: cls._add(day, sales_total, invoice_count, pending_count, overdue_count))
+    
+    @classmethod
+    def _add(cls, day, sales_total, invoice_count, pending_count, overdue_count):
+        cls.objects.get_or_create(date=day)
+        cls.objects.filter(date=day).update(
+            sales_total=F('sales_total') + Value(Decimal(sales_total)),
+            invoice_count=F('invoice_count') + invoice_count,
+            pending_count=F('pending_count') + pending_count,
+            overdue_count=F('overdue_count') + overdue_count,
+            updated_at=timezone.now(),
+        )
+    
+    def __str__(self):
+        return f"{self.date} - KES {self.sales_total}"
+    
+    class Meta:
+        db_table = 'daily_sales_summary'
+        ordering = ['-date']
+        verbose_name_plural = 'Daily sales summaries'
+
+def rebuild_daily_sales(invoices, summaries):
+    """Recompute every DailySalesSummary row from the invoices; takes managers so migrations can pass historical models."""
+    rows = (
+        invoices.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(
+            sales_total=Sum('total_amount'),
+            invoice_count=Count('id'),
+            pending_count=Count('id', filter=Q(payment_status='pending')),
+            overdue_count=Count('id', filter=Q(payment_status='overdue')),
+        )
+    )
+    rebuilt = [
+        summaries.model(
+            date=row['day'],
+            sales_total=row['sales_total'] or 0,
+            invoice_count=row['invoice_count'],
+            pending_count=row['pending_count'],
+            overdue_count=row['overdue_count'],
+        )
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        summaries.all().delete()
+        summaries.bulk_create(rebuilt, batch_size=1000)
+    return len(rebuilt)
+
+class InvoiceSequence(models.Model):
+    """Per-day high-water mark for invoice numbers; workers reserve blocks from it."""
+    day = models.DateField(unique=True)
+    next_value = models.PositiveIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.day} -> {self.next_value}"
+    
+    class Meta:
+        db_table = 'invoice_sequence'
 
 class InvoiceItem(models.Model):
     invoice = models.ForeignKey(Invoice, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(
+        'inventory.Product',
+        related_name='invoice_items',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_index=False,  # covered by invoice_item_product_idx
+    )
     description = models.CharField(max_length=200)
+    # Snapshotted from the product at sale time so reports survive later price edits
+    sku = models.CharField(max_length=50, blank=True, editable=False)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    # Units this line holds on the product's reserved_quantity until the invoice is paid (billing.reservations)
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False)
+    reserved_until = models.DateTimeField(null=True, blank=True, editable=False)
+    # Units whose hold expired before payment: back on sale, but still taken off stock if the invoice is paid
+    lapsed_quantity = models.PositiveIntegerField(default=0, editable=False)
+    
+    def snapshot_product(self):
+        """Copy SKU, cost (and a default unit price/description) from the linked product."""
+        if self.product_id is None:
+            return
+        if self.sku and self.cost_price is not None and self.unit_price is not None and self.description:
+            return  # already filled in (e.g. from the price table); skip loading the product
+        product = self.product
+        if not self.sku:
+            self.sku = product.sku
+        if self.cost_price is None:
+            self.cost_price = product.cost_price
+        if self.unit_price is None:
+            self.unit_price = product.unit_price
+        if not self.description:
+            self.description = product.name
     
     def save(self, *args, **kwargs):
+        self.snapshot_product()
         self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
         
         # Update invoice subtotal
-        self.invoice.subtotal = sum(item.total_price for item in self.invoice.items.all())
-        self.invoice.save()
+        self.invoice.recalculate_totals()
+    
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        # The pre_delete receiver (billing.apps) gives back what the line holds
+        result = super().delete(*args, **kwargs)
+        self.invoice.recalculate_totals()
+        return result
     
     def __str__(self):
         return f"{self.description} - {self.invoice.invoice_number}"
     
     class Meta:
         db_table = 'invoice_item'
+        indexes = [
+            models.Index(fields=['product', 'invoice'], name='invoice_item_product_idx'),
+            models.Index(fields=['reserved_until'], name='invoice_item_reserved_idx'),
+        ]
 
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -114,13 +420,24 @@ class Payment(models.Model):
     payment_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
     
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            previous_amount = Decimal('0.00')
+        else:
+            previous_amount = Payment.objects.filter(pk=self.pk).values_list('amount', flat=True).first() or Decimal('0.00')
         super().save(*args, **kwargs)
         
-        # Update invoice paid amount
-        total_paid = sum(payment.amount for payment in self.invoice.payments.all())
-        self.invoice.paid_amount = total_paid
-        self.invoice.save()
+        # Apply only the change to the invoice ledger instead of re-summing every payment
+        delta = Decimal(self.amount) - previous_amount
+        if delta:
+            self.invoice.apply_payment(delta)
+    
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invoice.apply_payment(-Decimal(self.amount))
+        return result
     
     def __str__(self):
         return f"Payment {self.amount} for {self.invoice.invoice_number}"
@@ -141,6 +458,9 @@ class AccountsReceivable(models.Model):
     
     class Meta:
         db_table = 'accounts_receivable'
+        indexes = [
+            models.Index(fields=['is_settled', 'due_date'], name='ar_settled_due_idx'),
+        ]
 
 class AccountsPayable(models.Model):
     staff_member = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
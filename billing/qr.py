@@ -0,0 +1,120 @@
+"""Content-addressed on-disk cache for invoice payment QR codes (MEDIA_ROOT/qr_cache/)."""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+QR_CACHE_DIR = 'qr_cache'
+
+QR_FORMATS = ('png', 'svg')
+
+_count_lock = threading.Lock()
+# cache root -> approximate number of files in it (see _note_write)
+_file_counts = {}
+
+
+def invoice_qr_payload(invoice):
+    return (
+        f'Invoice: {invoice.invoice_number}\n'
+        f'Amount: KES {invoice.total_amount}\n'
+        f"Due: {invoice.due_date.strftime('%Y-%m-%d')}"
+    )
+
+
+def _cache_root():
+    return Path(settings.MEDIA_ROOT) / QR_CACHE_DIR
+
+
+def _cache_key(payload, fmt):
+    return hashlib.sha256(f'{fmt}:{payload}'.encode('utf-8')).hexdigest()
+
+
+def _render(payload, fmt):
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    if fmt == 'svg':
+        # Pure-Python path renderer: no PIL rasterisation or PNG encoding.
+        from qrcode.image.svg import SvgPathImage
+
+        img = qr.make_image(image_factory=SvgPathImage)
+        return img.to_string()
+
+    img = qr.make_image(fill_color='black', back_color='white')
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _evict(root, keep):
+    """Delete the least recently used files under root beyond keep; returns the files left."""
+    entries = []
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue
+    overflow = len(entries) - keep
+    if overflow <= 0:
+        return len(entries)
+    entries.sort()
+    for _mtime, path in entries[:overflow]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return keep
+
+
+def _note_write(root, max_files):
+    # Files under root as of the last walk plus this process's writes since, so a miss only walks
+    # the cache when the count reaches max_files, and then trims it to 90% to leave headroom for
+    # the next tenth of misses. Other workers' writes are only seen at their own walks.
+    with _count_lock:
+        count = _file_counts.get(root)
+        if count is None:
+            # First write this process has seen here; the walk already includes it
+            count = _evict(root, max_files)
+        else:
+            count += 1
+        if count > max_files:
+            count = _evict(root, max(0, max_files - max(1, max_files // 10)))
+        _file_counts[root] = count
+
+
+def get_qr_code_url(payload, fmt=None):
+    """Media URL of the QR image for ``payload``, rendered and written on a miss."""
+    fmt = (fmt or getattr(settings, 'QR_CODE_FORMAT', 'png')).lower()
+    if fmt not in QR_FORMATS:
+        raise ValueError(f'Unsupported QR code format: {fmt}')
+
+    key = _cache_key(payload, fmt)
+    relative = f'{QR_CACHE_DIR}/{key[:2]}/{key}.{fmt}'
+    path = Path(settings.MEDIA_ROOT) / relative
+
+    try:
+        # A hit only touches the mtime, which _evict uses as the LRU clock
+        os.utime(path)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(_render(payload, fmt))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _note_write(_cache_root(), getattr(settings, 'QR_CACHE_MAX_FILES', 2000))
+
+    return f'{settings.MEDIA_URL}{relative}'
@@ -0,0 +1,255 @@
+"""PDF receipts cached per invoice version under MEDIA_ROOT/receipt_cache/, and 80mm thermal receipts."""
+
+import hashlib
+import io
+import os
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+RECEIPT_CACHE_DIR = 'receipt_cache'
+
+# How long a request waits for another worker that is already rendering the
+# same receipt before giving up on the lock and rendering it itself.
+RENDER_LOCK_TIMEOUT = 30.0
+_RENDER_POLL_INTERVAL = 0.05
+
+# 80mm paper fits 48 characters per line in the printer's default font.
+THERMAL_WIDTH = 48
+
+_ESC_INIT = b'\x1b@'
+_ESC_ALIGN_LEFT = b'\x1ba\x00'
+_ESC_ALIGN_CENTER = b'\x1ba\x01'
+_ESC_BOLD_ON = b'\x1bE\x01'
+_ESC_BOLD_OFF = b'\x1bE\x00'
+_ESC_FEED_AND_CUT = b'\n\n\n\x1dVA\x00'
+
+
+def receipt_version(invoice, items):
+    """Hash of everything printed on the receipt, so any change gets a new cached file."""
+    h = hashlib.sha256()
+    fields = [
+        invoice.invoice_number,
+        invoice.created_at.isoformat(),
+        invoice.customer.name if invoice.customer else '',
+        invoice.staff_member.get_full_name(),
+        invoice.subtotal,
+        invoice.tax_rate,
+        invoice.tax_amount,
+        invoice.discount_amount,
+        invoice.total_amount,
+        invoice.paid_amount,
+    ]
+    for item in items:
+        fields.extend([item.pk, item.description, item.quantity, item.unit_price, item.total_price])
+    h.update('\x1f'.join(str(f) for f in fields).encode('utf-8'))
+    return h.hexdigest()[:32]
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    return {
+        'sheet': getSampleStyleSheet(),
+        'details': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'items': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]),
+        'totals': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, -2), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+    }
+
+
+def render_receipt_pdf(invoice, items):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    styles = _styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+
+    # Header
+    story.append(Paragraph('SUPERMARKET RECEIPT', styles['sheet']['Title']))
+    story.append(Spacer(1, 12))
+
+    # Invoice details
+    invoice_data = [
+        ['Invoice Number:', invoice.invoice_number],
+        ['Date:', invoice.created_at.strftime('%Y-%m-%d %H:%M')],
+        ['Customer:', invoice.customer.name if invoice.customer else 'Walk-in Customer'],
+        ['Staff:', invoice.staff_member.get_full_name()],
+    ]
+    invoice_table = Table(invoice_data, colWidths=[2 * 72, 4 * 72])
+    invoice_table.setStyle(styles['details'])
+    story.append(invoice_table)
+    story.append(Spacer(1, 12))
+
+    # Items
+    items_data = [['Description', 'Qty', 'Unit Price', 'Total']]
+    for item in items:
+        items_data.append([
+            item.description,
+            str(item.quantity),
+            f'KES {item.unit_price}',
+            f'KES {item.total_price}',
+        ])
+    items_table = Table(items_data, colWidths=[3 * 72, 1 * 72, 1.5 * 72, 1.5 * 72])
+    items_table.setStyle(styles['items'])
+    story.append(items_table)
+    story.append(Spacer(1, 12))
+
+    # Totals
+    totals_data = [
+        ['Subtotal:', f'KES {invoice.subtotal}'],
+        [f'Tax ({invoice.tax_rate}%):', f'KES {invoice.tax_amount}'],
+        ['Discount:', f'KES {invoice.discount_amount}'],
+        ['Total:', f'KES {invoice.total_amount}'],
+        ['Paid:', f'KES {invoice.paid_amount}'],
+        ['Balance:', f'KES {invoice.total_amount - invoice.paid_amount}'],
+    ]
+    totals_table = Table(totals_data, colWidths=[4 * 72, 2 * 72])
+    totals_table.setStyle(styles['totals'])
+    story.append(totals_table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _drop_stale_versions(directory, keep):
+    for old in directory.glob('*.pdf'):
+        if old != keep:
+            try:
+                old.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def get_receipt_pdf(invoice):
+    """Return ``(path, version)`` of the cached PDF receipt, rendering it on a miss."""
+    items = list(invoice.items.all())
+    version = receipt_version(invoice, items)
+    directory = Path(settings.MEDIA_ROOT) / RECEIPT_CACHE_DIR / str(invoice.pk)
+    path = directory / f'{version}.pdf'
+    if path.exists():
+        return path, version
+
+    # Only the request that creates the .lock file renders; the others wait for the PDF
+    directory.mkdir(parents=True, exist_ok=True)
+    lock_path = directory / f'{version}.lock'
+    deadline = time.monotonic() + RENDER_LOCK_TIMEOUT
+    while True:
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if path.exists():
+                return path, version
+            if time.monotonic() < deadline:
+                time.sleep(_RENDER_POLL_INTERVAL)
+                continue
+            # The holder died or is stuck; render without the lock.
+            lock_fd = None
+        break
+
+    try:
+        if not path.exists():
+            _write_atomic(path, render_receipt_pdf(invoice, items))
+            _drop_stale_versions(directory, path)
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
+            try:
+                os.unlink(lock_path)
+            except FileNotFoundError:
+                pass
+    return path, version
+
+
+def _two_column(left, right, width):
+    room = width - len(right) - 1
+    if len(left) > room:
+        left = left[:max(room, 0)]
+    return f'{left:<{room}} {right}'
+
+
+def render_thermal_receipt(invoice, items, payments, *, escpos=True, width=THERMAL_WIDTH):
+    """Fixed-width receipt for 80mm thermal printers, as ESC/POS bytes or (escpos=False) plain UTF-8 text."""
+    rule = '-' * width
+    header = ['SUPERMARKET RECEIPT']
+    body = [
+        _two_column('Invoice:', invoice.invoice_number, width),
+        _two_column('Date:', invoice.created_at.strftime('%Y-%m-%d %H:%M'), width),
+        _two_column('Customer:', invoice.customer.name if invoice.customer else 'Walk-in Customer', width),
+        _two_column('Staff:', invoice.staff_member.get_full_name(), width),
+        rule,
+    ]
+    for item in items:
+        body.append(item.description[:width])
+        body.append(_two_column(f'  {item.quantity} x {item.unit_price}', f'{item.total_price}', width))
+    body.extend([
+        rule,
+        _two_column('Subtotal:', f'KES {invoice.subtotal}', width),
+        _two_column(f'Tax ({invoice.tax_rate}%):', f'KES {invoice.tax_amount}', width),
+        _two_column('Discount:', f'KES {invoice.discount_amount}', width),
+    ])
+    total = _two_column('TOTAL:', f'KES {invoice.total_amount}', width)
+    footer = []
+    for payment in payments:
+        footer.append(_two_column(f'Paid ({payment.get_payment_method_display()}):', f'KES {payment.amount}', width))
+    footer.extend([
+        _two_column('Balance:', f'KES {invoice.total_amount - invoice.paid_amount}', width),
+        rule,
+    ])
+    thanks = ['Thank you for shopping with us!']
+
+    if not escpos:
+        lines = [line.center(width).rstrip() for line in header] + body + [total] + footer
+        lines += [line.center(width).rstrip() for line in thanks]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def encode(lines):
+        return ('\n'.join(lines) + '\n').encode('cp437', errors='replace')
+
+    return b''.join([
+        _ESC_INIT,
+        _ESC_ALIGN_CENTER, _ESC_BOLD_ON, encode(header), _ESC_BOLD_OFF,
+        _ESC_ALIGN_LEFT, encode(body),
+        _ESC_BOLD_ON, encode([total]), _ESC_BOLD_OFF,
+        encode(footer),
+        _ESC_ALIGN_CENTER, encode(thanks),
+        _ESC_FEED_AND_CUT,
+    ])
@@ -0,0 +1,144 @@
+"""Stock held by open invoices between adding product lines and payment (see InvoiceItem.reserved_quantity)."""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from inventory import reservations as stock_reservations
+from inventory import stock as stock_ledger
+from inventory.models import StockMovement
+
+from .models import Invoice, InvoiceItem
+
+SWEEP_BATCH_SIZE = 1000
+
+
+def _ttl():
+    return timedelta(seconds=int(getattr(settings, 'STOCK_RESERVATION_TTL', 4 * 3600)))
+
+
+def _shelf_units(item):
+    # Fractional quantities are loose goods sold by weight or length, not units on the shelf
+    if item.product_id and item.quantity > 0 and item.quantity == item.quantity.to_integral_value():
+        return int(item.quantity)
+    return 0
+
+
+def sell(invoice, items, *, user=None):
+    """Take unsaved lines of an already paid invoice straight off stock as one SALE batch."""
+    quantities = defaultdict(int)
+    for item in items:
+        units = _shelf_units(item)
+        if units:
+            quantities[item.product_id] += units
+    if quantities:
+        stock_ledger.record_movements(StockMovement.SALE, quantities, reference=invoice.invoice_number, user=user)
+
+
+def hold(invoice, items, *, allow_oversell=False):
+    """Reserve stock for unsaved lines of invoice and extend its holds; raises InsufficientStock if short."""
+    if invoice.payment_status in ('paid', 'cancelled'):
+        return
+    items = list(items)
+    quantities = defaultdict(int)
+    for item in items:
+        item.reserved_quantity = _shelf_units(item)
+        if item.reserved_quantity:
+            quantities[item.product_id] += item.reserved_quantity
+    if not quantities:
+        return
+    until = timezone.now() + _ttl()
+    with transaction.atomic():
+        stock_reservations.reserve(quantities, allow_oversell=allow_oversell)
+        InvoiceItem.objects.filter(invoice=invoice, reserved_quantity__gt=0).update(reserved_until=until)
+    for item in items:
+        if item.reserved_quantity:
+            item.reserved_until = until
+
+
+def _release(lines, lapse=False):
+    """Clear the holds of lines and return the units to stock; returns [(invoice_id, product_id, units owed)]."""
+    owed = Q(reserved_quantity__gt=0)
+    if not lapse:
+        owed |= Q(lapsed_quantity__gt=0)
+    with transaction.atomic():
+        # Locked and zeroed before the counters move, so two releases never give the same units back twice
+        rows = list(
+            lines.filter(owed)
+            .order_by()
+            .select_for_update()
+            .values_list('id', 'invoice_id', 'product_id', 'reserved_quantity', 'lapsed_quantity')
+        )
+        if not rows:
+            return []
+        cleared = InvoiceItem.objects.filter(pk__in=[row[0] for row in rows])
+        if lapse:
+            # An expired hold: the units stay owed, so paying the invoice later still sells them.
+            # lapsed_quantity first, as MySQL assigns left to right against already-updated columns.
+            cleared.update(
+                lapsed_quantity=F('lapsed_quantity') + F('reserved_quantity'), reserved_quantity=0, reserved_until=None,
+            )
+        else:
+            cleared.update(reserved_quantity=0, lapsed_quantity=0, reserved_until=None)
+        totals = defaultdict(int)
+        for _pk, _invoice_id, product_id, held, _lapsed in rows:
+            # A deleted product took its reservation counter with it
+            if product_id is not None and held:
+                totals[product_id] += held
+        stock_reservations.release(totals)
+    return [
+        (invoice_id, product_id, held + lapsed)
+        for _pk, invoice_id, product_id, held, lapsed in rows
+        if product_id is not None
+    ]
+
+
+def release_items(item_ids):
+    """Give back what the given lines hold, e.g. before deleting or re-pricing them."""
+    item_ids = list(item_ids)
+    if item_ids:
+        _release(InvoiceItem.objects.filter(pk__in=item_ids))
+
+
+def release_invoices(invoice_ids, *, sold=False, user=None):
+    """End every hold on the given invoices; if sold, held and lapsed units become SALE movements."""
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids:
+        return
+    with transaction.atomic():
+        released = _release(InvoiceItem.objects.filter(invoice_id__in=invoice_ids))
+        if not sold or not released:
+            return
+        per_invoice = defaultdict(lambda: defaultdict(int))
+        for invoice_id, product_id, units in released:
+            per_invoice[invoice_id][product_id] += units
+        numbers = dict(Invoice.objects.filter(pk__in=per_invoice).values_list('id', 'invoice_number'))
+        for invoice_id, quantities in per_invoice.items():
+            stock_ledger.record_movements(
+                StockMovement.SALE, quantities, reference=numbers.get(invoice_id, ''), user=user,
+            )
+
+
+def release_expired(now=None, *, batch_size=SWEEP_BATCH_SIZE):
+    """Release every hold whose reserved_until has passed, in batches. Returns the lines released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Lines a request is paying for or editing right now are skipped and picked up next run
+            batch = list(
+                InvoiceItem.objects.filter(reserved_until__lt=now)
+                .order_by()
+                .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            released += len(_release(InvoiceItem.objects.filter(pk__in=batch, reserved_until__lt=now), lapse=True))
+        if len(batch) < batch_size:
+            break
+    return released
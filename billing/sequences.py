@@ -0,0 +1,74 @@
+"""Per-day invoice numbers (INV-YYYYMMDD-NNNNNN), handed out from blocks each thread reserves on InvoiceSequence."""
+
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import InvoiceSequence
+
+_local = threading.local()
+
+
+def _block_size():
+    return max(1, int(getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 50)))
+
+
+class _Block:
+    def __init__(self, day, start, end):
+        self.day, self.next, self.end = day, start, end
+        self.committed = not connection.in_atomic_block
+        if not self.committed:
+            transaction.on_commit(self._commit)
+            self._slot = len(getattr(connection, 'run_on_commit', ())) - 1
+
+    def _commit(self):
+        self.committed = True
+
+    def usable(self, day):
+        if self.day != day or self.next >= self.end:
+            return False
+        if self.committed:
+            return True
+        # A rollback undoes the reservation and drops its on_commit callback; a block whose callback
+        # is gone may be handed out again elsewhere. Django has no public rollback hook, so this reads
+        # its pending-callback list (savepoint rollbacks only ever drop the tail of it). Membership
+        # rather than a tuple index, and an unrecognised list only costs a fresh block;
+        # InvoiceSequenceTests pin the behaviour so a Django upgrade that changes it fails loudly.
+        pending = getattr(connection, 'run_on_commit', None)
+        if not isinstance(pending, list) or self._slot >= len(pending):
+            return False
+        entry = pending[self._slot]
+        return isinstance(entry, tuple) and self._commit in entry
+
+
+def _reserve_block(day, size):
+    with transaction.atomic():
+        # UPDATE before any read, so the row (or SQLite's write) lock is taken first
+        rows = InvoiceSequence.objects.filter(day=day)
+        if not rows.update(next_value=F('next_value') + size):
+            InvoiceSequence.objects.get_or_create(day=day)
+            rows.update(next_value=F('next_value') + size)
+        end = rows.values_list('next_value', flat=True).get()
+    return _Block(day, end - size, end)
+
+
+def format_invoice_number(day, value):
+    return f"INV-{day.strftime('%Y%m%d')}-{value:06d}"
+
+
+def next_invoice_number():
+    day = timezone.localdate()
+    block = getattr(_local, 'block', None)
+    if block is None or not block.usable(day):
+        block = _local.block = _reserve_block(day, _block_size())
+    value = block.next
+    block.next += 1
+    return format_invoice_number(day, value)
+
+
+def discard_blocks():
+    """Forget this thread's block, e.g. after one of its numbers collided on insert."""
+    _local.block = None
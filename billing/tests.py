@@ -0,0 +1,431 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from inventory import prices
+from inventory.models import Category, Product, StockMovement
+from .models import Customer, DailySalesSummary, Invoice, InvoiceItem, InvoiceSequence, Payment
+from . import qr, reservations, sequences, views
+
+
+def make_invoice(staff_member, subtotal='100.00', **kwargs):
+    kwargs.setdefault('due_date', timezone.now() + timedelta(days=7))
+    kwargs.setdefault('tax_rate', Decimal('0.00'))
+    return Invoice.objects.create(staff_member=staff_member, subtotal=Decimal(subtotal), **kwargs)
+
+
+class InvoicePaymentLedgerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+        self.invoice = make_invoice(self.user)
+
+    def test_concurrent_payments_are_all_applied(self):
+        errors = []
+
+        def pay():
+            try:
+                Invoice.objects.get(pk=self.invoice.pk).apply_payment(Decimal('5.00'))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('40.00'))
+        self.assertEqual(self.invoice.payment_status, 'partial')
+
+    def test_stale_save_keeps_committed_payment(self):
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        Invoice.objects.get(pk=self.invoice.pk).apply_payment(Decimal('50.00'))
+
+        stale.notes = 'Edited after the payment'
+        stale.save()
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('50.00'))
+        self.assertEqual(self.invoice.payment_status, 'partial')
+        self.assertEqual(self.invoice.notes, 'Edited after the payment')
+
+    def test_stale_copy_can_still_cancel(self):
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        Invoice.objects.get(pk=self.invoice.pk).apply_payment(Decimal('50.00'))
+
+        stale.payment_status = 'cancelled'
+        stale.save()
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.payment_status, 'cancelled')
+        self.assertEqual(self.invoice.paid_amount, Decimal('50.00'))
+
+
+class ReceiptCacheTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+        self.client.force_login(self.user)
+        self.invoice = make_invoice(self.user)
+        self.url = reverse('generate_receipt', args=[self.invoice.pk])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        if response.streaming:
+            # Draining the content also closes the file, via the test client's wrapper
+            b''.join(response.streaming_content)
+        return response
+
+    def test_unchanged_receipt_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+
+        again = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_payment_changes_the_etag(self):
+        first = self.get()
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('10.00'), payment_method='cash')
+
+        after = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], first['ETag'])
+
+
+class QRCacheTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=self.media_root, QR_CACHE_MAX_FILES=100))
+
+    def cached_files(self):
+        return [name for _dirpath, _dirnames, names in os.walk(self.media_root) for name in names]
+
+    def test_misses_walk_the_cache_only_when_it_is_full(self):
+        with mock.patch.object(qr, '_evict', wraps=qr._evict) as evict:
+            urls = [qr.get_qr_code_url(f'payload {n}', 'svg') for n in range(300)]
+
+        self.assertLessEqual(len(self.cached_files()), 100)
+        # One walk on the first miss, then one per tenth of the limit rather than one per miss
+        self.assertLessEqual(evict.call_count, 1 + 200 // 10)
+        self.assertIn(urls[-1].rsplit('/', 1)[1], self.cached_files())
+
+
+class InvoiceListKeysetTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+        self.client.force_login(self.user)
+        invoices = [make_invoice(self.user) for _ in range(13)]
+        # Several invoices share a timestamp, so pages have to break ties on id
+        base = timezone.now() - timedelta(days=1)
+        for n, invoice in enumerate(invoices):
+            Invoice.objects.filter(pk=invoice.pk).update(created_at=base + timedelta(minutes=n // 3))
+        self.expected = list(Invoice.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    @mock.patch.object(views, 'INVOICE_PAGE_SIZE', 4)
+    def test_pages_cover_every_invoice_once(self):
+        seen, query, pages = [], '', 0
+        while query is not None:
+            response = self.client.get(f"{reverse('invoice_list')}?{query}")
+            self.assertEqual(response.status_code, 200)
+            seen.extend(invoice.pk for invoice in response.context['invoices'])
+            query = response.context['next_query']
+            pages += 1
+            self.assertLessEqual(pages, 4)
+
+        self.assertEqual(seen, self.expected)
+
+
+class DailySalesRollupTests(TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+
+    def rollup(self):
+        return {
+            row['date']: row
+            for row in DailySalesSummary.objects.values(
+                'date', 'sales_total', 'invoice_count', 'pending_count', 'overdue_count',
+            )
+        }
+
+    def test_incremental_rollup_matches_rebuild(self):
+        paid_in_part = make_invoice(self.user, '100.00', tax_rate=Decimal('8.25'))
+        cancelled = make_invoice(self.user, '50.00')
+        overdue = make_invoice(self.user, '20.00', due_date=timezone.now() - timedelta(days=1))
+        deleted = make_invoice(self.user, '75.00')
+
+        # Stale copies are saved after other writers changed the same invoices
+        stale = Invoice.objects.get(pk=paid_in_part.pk)
+        Payment.objects.create(invoice=paid_in_part, amount=Decimal('30.00'), payment_method='cash')
+        stale.notes = 'Edited by a second till'
+        stale.save()
+
+        stale = Invoice.objects.get(pk=cancelled.pk)
+        cancelled.add_items([InvoiceItem(description='Bag', quantity=Decimal('3'), unit_price=Decimal('0.50'))])
+        cancelled.payment_status = 'cancelled'
+        cancelled.save()
+        stale.save()
+
+        overdue.apply_payment(overdue.total_amount)
+        Invoice.objects.get(pk=deleted.pk).delete()
+        # Queryset and cascade deletes skip Invoice.delete
+        Invoice.objects.filter(pk=make_invoice(self.user, '12.00').pk).delete()
+        make_invoice(self.user, '8.00', customer=Customer.objects.create(name='Amina')).customer.delete()
+
+        incremental = self.rollup()
+        call_command('rebuild_daily_sales', stdout=io.StringIO())
+        self.assertEqual(incremental, self.rollup())
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        # Products created here never commit, so make sure no earlier test's price table is reused
+        prices.bump_version()
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(
+            name='Milk 500ml', category=category, sku='MLK', barcode='5000000000017',
+            unit_price=Decimal('2.50'), cost_price=Decimal('1.80'), quantity_in_stock=10,
+        )
+
+    def post(self, data):
+        return self.client.post(reverse('checkout'), json.dumps(data), content_type='application/json')
+
+    def test_basket_is_priced_from_the_catalogue(self):
+        response = self.post({
+            'items': [
+                {'sku': 'MLK', 'quantity': 2},
+                {'barcode': '5000000000017'},
+                {'description': 'Carrier bag', 'unit_price': '0.10'},
+            ],
+            'discount_amount': '0.60',
+            'payments': [{'amount': '10.00', 'payment_method': 'cash'}],
+        })
+        self.assertEqual(response.status_code, 201)
+        invoice = Invoice.objects.get(pk=response.json()['invoice_id'])
+        self.assertEqual(
+            sorted(invoice.items.values_list('description', 'unit_price')),
+            [('Carrier bag', Decimal('0.10')), ('Milk 500ml', Decimal('2.50')), ('Milk 500ml', Decimal('2.50'))],
+        )
+        self.assertEqual(invoice.subtotal, Decimal('7.60'))
+        self.assertEqual(invoice.tax_rate, Invoice._meta.get_field('tax_rate').default)
+        expected_total = Decimal('7.60') * (1 + invoice.tax_rate / 100) - Decimal('0.60')
+        self.assertEqual(invoice.total_amount, expected_total.quantize(Decimal('0.01')))
+        self.assertEqual(invoice.payment_status, 'paid')
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity_in_stock, 7)
+
+    def test_client_price_for_a_stocked_product_is_rejected(self):
+        for line in ({'sku': 'MLK', 'unit_price': '0.01'}, {'barcode': '5000000000017', 'unit_price': '0.01'}):
+            with self.subTest(line=line):
+                response = self.post({'items': [line]})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_client_tax_rate_is_rejected(self):
+        response = self.post({'items': [{'sku': 'MLK'}], 'tax_rate': '0'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_discount_must_lie_within_the_subtotal(self):
+        for discount in ('-1.00', '5.01', 'lots'):
+            with self.subTest(discount=discount):
+                response = self.post({'items': [{'sku': 'MLK', 'quantity': 2}], 'discount_amount': discount})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+        response = self.post({'items': [{'sku': 'MLK', 'quantity': 2}], 'discount_amount': '5.00'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_malformed_customer_id_is_rejected(self):
+        for customer_id in ('abc', [1], {'id': 1}, 1.5, True, 10 ** 30):
+            with self.subTest(customer_id=customer_id):
+                response = self.post({'items': [{'sku': 'MLK'}], 'customer_id': customer_id})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_unknown_sku_is_rejected(self):
+        response = self.post({'items': [{'sku': 'NOPE'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('NOPE', response.json()['error'])
+
+
+class InvoiceSequenceTests(TransactionTestCase):
+    def setUp(self):
+        sequences.discard_blocks()
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+
+    def test_numbers_increase_within_the_day(self):
+        numbers = [make_invoice(self.user).invoice_number for _ in range(3)]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(set(numbers)), 3)
+        self.assertRegex(numbers[0], r'^INV-\d{8}-\d{6}$')
+
+    def test_block_reserved_in_a_rolled_back_transaction_is_dropped(self):
+        with transaction.atomic():
+            sequences.next_invoice_number()
+            transaction.set_rollback(True)
+
+        # Anything handed out now must lie below the committed high-water mark, or another
+        # process reserving from the sequence would be given the same numbers
+        value = int(sequences.next_invoice_number().rsplit('-', 1)[1])
+        self.assertLess(value, InvoiceSequence.objects.get(day=timezone.localdate()).next_value)
+
+    def test_block_reserved_in_a_rolled_back_savepoint_is_dropped(self):
+        with transaction.atomic():
+            with transaction.atomic():
+                sequences.next_invoice_number()
+                transaction.set_rollback(True)
+            value = int(sequences.next_invoice_number().rsplit('-', 1)[1])
+        self.assertLess(value, InvoiceSequence.objects.get(day=timezone.localdate()).next_value)
+        self.assertEqual(InvoiceSequence.objects.get(day=timezone.localdate()).next_value, value + sequences._block_size())
+
+    def test_block_is_reused_while_its_transaction_is_open(self):
+        # Pins how Django tracks pending on_commit callbacks (billing.sequences._Block.usable): if
+        # that changes, every number would take a fresh block and this fails
+        with transaction.atomic():
+            first = sequences.next_invoice_number()
+            with transaction.atomic():
+                second = sequences.next_invoice_number()
+            third = sequences.next_invoice_number()
+        values = [int(number.rsplit('-', 1)[1]) for number in (first, second, third)]
+        self.assertEqual(values, [values[0], values[0] + 1, values[0] + 2])
+        self.assertEqual(
+            InvoiceSequence.objects.get(day=timezone.localdate()).next_value, values[0] + sequences._block_size(),
+        )
+
+
+class SalesReportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('manager', password='x', role='manager')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Bakery')
+        self.bread = Product.objects.create(
+            name='Bread', category=category, sku='BRD', unit_price=Decimal('1.20'),
+            cost_price=Decimal('0.70'), quantity_in_stock=50,
+        )
+
+    def sell(self, quantity):
+        invoice = make_invoice(self.user, '0.00')
+        invoice.add_items([InvoiceItem(product=self.bread, quantity=Decimal(quantity))])
+        return invoice
+
+    def test_cancelled_invoices_are_left_out(self):
+        self.sell(3)
+        cancelled = self.sell(5)
+        cancelled.payment_status = 'cancelled'
+        cancelled.save()
+
+        response = self.client.get(reverse('sales_report'))
+        [row] = response.context['rows']
+        self.assertEqual(row['units_sold'], Decimal('3'))
+        self.assertEqual(row['revenue'], Decimal('3.60'))
+        self.assertEqual(response.context['totals']['revenue'], Decimal('3.60'))
+
+
+class ReservationSaleTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('cashier', password='x')
+        category = Category.objects.create(name='Pantry')
+        self.rice = Product.objects.create(
+            name='Rice 1kg', category=category, sku='RCE', unit_price=Decimal('2.00'),
+            cost_price=Decimal('1.10'), quantity_in_stock=10,
+        )
+        self.invoice = make_invoice(self.user, '0.00')
+        self.invoice.add_items([InvoiceItem(product=self.rice, quantity=Decimal('4'))])
+
+    def expire_holds(self):
+        return reservations.release_expired(now=timezone.now() + timedelta(days=1))
+
+    def test_paying_after_the_hold_lapsed_still_sells_the_units(self):
+        self.assertEqual(self.expire_holds(), 1)
+        self.rice.refresh_from_db()
+        self.assertEqual((self.rice.quantity_in_stock, self.rice.reserved_quantity), (10, 0))
+
+        self.invoice.apply_payment(self.invoice.total_amount)
+
+        self.rice.refresh_from_db()
+        self.assertEqual((self.rice.quantity_in_stock, self.rice.reserved_quantity), (6, 0))
+        sale = StockMovement.objects.get(product=self.rice, movement_type=StockMovement.SALE)
+        self.assertEqual((sale.quantity, sale.reference), (-4, self.invoice.invoice_number))
+        self.assertEqual(self.invoice.items.get().lapsed_quantity, 0)
+
+    def test_lines_added_to_a_paid_invoice_are_sold(self):
+        self.invoice.apply_payment(self.invoice.total_amount)
+        self.invoice.add_items([InvoiceItem(product=self.rice, quantity=Decimal('3'))])
+        self.assertEqual(self.invoice.payment_status, 'partial')
+        self.invoice.apply_payment(self.invoice.total_amount - self.invoice.paid_amount)
+
+        self.rice.refresh_from_db()
+        self.assertEqual((self.rice.quantity_in_stock, self.rice.reserved_quantity), (3, 0))
+        sales = StockMovement.objects.filter(product=self.rice, movement_type=StockMovement.SALE)
+        self.assertEqual(sorted(sales.values_list('quantity', flat=True)), [-4, -3])
+
+    def test_cancelling_after_the_hold_lapsed_sells_nothing(self):
+        self.expire_holds()
+        self.invoice.payment_status = 'cancelled'
+        self.invoice.save()
+
+        self.rice.refresh_from_db()
+        self.assertEqual((self.rice.quantity_in_stock, self.rice.reserved_quantity), (10, 0))
+        self.assertFalse(StockMovement.objects.filter(movement_type=StockMovement.SALE).exists())
+        self.assertEqual(self.invoice.items.get().lapsed_quantity, 0)
+
+
+class ReservationDeleteTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        category = Category.objects.create(name='Pantry')
+        self.rice = Product.objects.create(
+            name='Rice 1kg', category=category, sku='RCE', unit_price=Decimal('2.00'),
+            cost_price=Decimal('1.10'), quantity_in_stock=10,
+        )
+
+    def held_invoice(self, **kwargs):
+        invoice = make_invoice(self.user, '0.00', **kwargs)
+        invoice.add_items([InvoiceItem(product=self.rice, quantity=Decimal('4'))])
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.reserved_quantity, 4)
+        return invoice
+
+    def assert_nothing_held(self):
+        self.rice.refresh_from_db()
+        self.assertEqual((self.rice.reserved_quantity, self.rice.available_quantity), (0, 10))
+
+    def test_admin_bulk_delete_gives_back_held_stock(self):
+        invoice = self.held_invoice()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:billing_invoice_changelist'), {
+            'action': 'delete_selected', '_selected_action': [invoice.pk], 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Invoice.objects.exists())
+        self.assert_nothing_held()
+
+    def test_deleting_the_customer_gives_back_held_stock(self):
+        customer = Customer.objects.create(name='Amina')
+        self.held_invoice(customer=customer)
+        customer.delete()
+        self.assertFalse(Invoice.objects.exists())
+        self.assert_nothing_held()
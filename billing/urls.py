@@ -5,6 +5,8 @@ urlpatterns = [
     path('', views.billing_dashboard, name='billing_dashboard'),
     path('invoices/', views.invoice_list, name='invoice_list'),
     path('invoices/create/', views.create_invoice, name='create_invoice'),
+    path('invoices/export/', views.export_invoices, name='export_invoices'),
+    path('checkout/', views.checkout, name='checkout'),
     path('invoices/<int:invoice_id>/', views.invoice_detail, name='invoice_detail'),
     path('invoices/<int:invoice_id>/edit/', views.edit_invoice, name='edit_invoice'),
     path('invoices/<int:invoice_id>/payment/', views.add_payment, name='add_payment'),
@@ -12,6 +14,8 @@ urlpatterns = [
     path('items/<int:item_id>/delete/', views.delete_invoice_item, name='delete_invoice_item'),
     path('customers/', views.customer_list, name='customer_list'),
     path('customers/create/', views.create_customer, name='create_customer'),
+    path('customers/search/', views.customer_search, name='customer_search'),
+    path('reports/sales/', views.sales_report, name='sales_report'),
     path('accounts-receivable/', views.accounts_receivable_view, name='accounts_receivable'),
     path('accounts-payable/', views.accounts_payable_view, name='accounts_payable'),
 ]
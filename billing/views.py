@@ -1,41 +1,56 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Sum, Q
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Q
 from django.utils import timezone
-from datetime import datetime, timedelta
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import qrcode
-import io
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 import base64
-from .models import Invoice, InvoiceItem, Customer, Payment, AccountsReceivable, AccountsPayable
+import hashlib
+import json
+from .models import Invoice, InvoiceItem, Customer, Payment, AccountsReceivable, AccountsPayable, DailySalesSummary, CUSTOMER_SEARCH_VERSION_KEY, normalize_phone
 from .forms import InvoiceForm, InvoiceItemForm, CustomerForm, PaymentForm
+from .checkout import CheckoutError, process_checkout
+from inventory.reservations import InsufficientStock
+from supermarket.cache import cache_version
+from . import qr as qr_cache
+from . import receipts
+from . import exports
 
 @login_required
 def billing_dashboard(request):
     # Get billing statistics
-    today = timezone.now().date()
-    this_month = timezone.now().replace(day=1).date()
+    today = timezone.localdate()
+    this_month = today.replace(day=1)
+    
+    # Read the daily rollup rather than aggregating the invoice table
+    month_totals = DailySalesSummary.objects.filter(date__gte=this_month).aggregate(
+        monthly_sales=Sum('sales_total'),
+        today_sales=Sum('sales_total', filter=Q(date=today)),
+    )
+    open_counts = DailySalesSummary.objects.aggregate(
+        pending=Sum('pending_count'),
+        overdue=Sum('overdue_count'),
+    )
     
     stats = {
-        'today_sales': Invoice.objects.filter(created_at__date=today).aggregate(
-            total=Sum('total_amount'))['total'] or 0,
-        'monthly_sales': Invoice.objects.filter(created_at__date__gte=this_month).aggregate(
-            total=Sum('total_amount'))['total'] or 0,
-        'pending_invoices': Invoice.objects.filter(payment_status='pending').count(),
-        'overdue_invoices': Invoice.objects.filter(payment_status='overdue').count(),
+        'today_sales': month_totals['today_sales'] or 0,
+        'monthly_sales': month_totals['monthly_sales'] or 0,
+        'pending_invoices': open_counts['pending'] or 0,
+        'overdue_invoices': open_counts['overdue'] or 0,
     }
     
     # Recent invoices
-    recent_invoices = Invoice.objects.all()[:10]
+    recent_invoices = Invoice.objects.select_related('customer')[:10]
     
     # Accounts receivable
-    accounts_receivable = AccountsReceivable.objects.filter(is_settled=False)[:5]
+    accounts_receivable = AccountsReceivable.objects.filter(is_settled=False).select_related('customer', 'invoice')[:5]
     
     context = {
         'stats': stats,
@@ -68,11 +83,13 @@ def edit_invoice(request, invoice_id):
         if 'add_item' in request.POST:
             item_form = InvoiceItemForm(request.POST)
             if item_form.is_valid():
-                item = item_form.save(commit=False)
-                item.invoice = invoice
-                item.save()
-                messages.success(request, 'Item added successfully!')
-                return redirect('edit_invoice', invoice_id=invoice.id)
+                try:
+                    invoice.add_items([item_form.save(commit=False)])
+                except InsufficientStock as exc:
+                    messages.error(request, str(exc))
+                else:
+                    messages.success(request, 'Item added successfully!')
+                    return redirect('edit_invoice', invoice_id=invoice.id)
         elif 'update_invoice' in request.POST:
             form = InvoiceForm(request.POST, instance=invoice)
             if form.is_valid():
@@ -99,50 +116,152 @@ def delete_invoice_item(request, item_id):
     messages.success(request, 'Item deleted successfully!')
     return redirect('edit_invoice', invoice_id=invoice_id)
 
+INVOICE_PAGE_SIZE = 50
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def _filter_invoices(invoices, status, start_date, end_date, prefix=''):
+    """
+    Apply the invoice_list filters; dates become index-friendly created_at ranges.
+    ``prefix`` (e.g. 'invoice__') applies them to a related model's invoice.
+    """
+    if status:
+        invoices = invoices.filter(**{f'{prefix}payment_status': status})
+    start = _parse_date(start_date)
+    end = _parse_date(end_date)
+    if start:
+        invoices = invoices.filter(**{f'{prefix}created_at__gte': _day_start(start)})
+    if end:
+        invoices = invoices.filter(**{f'{prefix}created_at__lt': _day_start(end + timedelta(days=1))})
+    return invoices
+
+
+def _encode_cursor(invoice):
+    raw = f'{invoice.created_at.isoformat()}|{invoice.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 @login_required
 def invoice_list(request):
-    invoices = Invoice.objects.all()
-    
-    # Filter by status
     status = request.GET.get('status')
-    if status:
-        invoices = invoices.filter(payment_status=status)
-    
-    # Filter by date range
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
-    if start_date:
-        invoices = invoices.filter(created_at__date__gte=start_date)
-    if end_date:
-        invoices = invoices.filter(created_at__date__lte=end_date)
+    
+    invoices = _filter_invoices(
+        Invoice.objects.select_related('customer', 'staff_member'), status, start_date, end_date,
+    ).order_by('-created_at', '-id')
+    
+    # Keyset pagination on (created_at, id): every page is an index range scan,
+    # however deep into the history it is.
+    cursor = _decode_cursor(request.GET.get('cursor', ''))
+    if cursor:
+        created_at, pk = cursor
+        invoices = invoices.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    
+    page = list(invoices[:INVOICE_PAGE_SIZE + 1])
+    next_query = None
+    if len(page) > INVOICE_PAGE_SIZE:
+        page = page[:INVOICE_PAGE_SIZE]
+        params = request.GET.copy()
+        params['cursor'] = _encode_cursor(page[-1])
+        next_query = params.urlencode()
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_query = params.urlencode()
     
     context = {
-        'invoices': invoices,
+        'invoices': page,
         'status': status,
         'start_date': start_date,
         'end_date': end_date,
+        'next_query': next_query,
+        'first_query': first_query,
+        'is_first_page': cursor is None,
     }
     
     return render(request, 'billing/invoice_list.html', context)
 
+@login_required
+@require_POST
+def checkout(request):
+    """JSON POS checkout: one request creates the invoice, items, payments and stock moves."""
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    try:
+        invoice = process_checkout(data, request.user)
+    except CheckoutError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse({
+        'invoice_id': invoice.id,
+        'invoice_number': invoice.invoice_number,
+        'total_amount': str(invoice.total_amount),
+        'paid_amount': str(invoice.paid_amount),
+        'payment_status': invoice.payment_status,
+        'receipt_url': reverse('generate_receipt', args=[invoice.id]),
+    }, status=201)
+
+@login_required
+def export_invoices(request):
+    """
+    Stream invoices, line items or payments as CSV or JSON lines using the
+    invoice_list filters; rows are pulled from the DB in batches, never all at once.
+    """
+    dataset = request.GET.get('dataset', 'invoices')
+    export_format = request.GET.get('format', 'csv')
+    if dataset not in exports.DATASETS or export_format not in ('csv', 'jsonl'):
+        return HttpResponse('Unknown export dataset or format.', status=400)
+    
+    model, columns = exports.DATASETS[dataset]
+    prefix = '' if model is Invoice else 'invoice__'
+    queryset = _filter_invoices(
+        model.objects.all(),
+        request.GET.get('status'),
+        request.GET.get('start_date'),
+        request.GET.get('end_date'),
+        prefix=prefix,
+    )
+    
+    if export_format == 'csv':
+        response = StreamingHttpResponse(exports.stream_csv(queryset, columns), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(exports.stream_jsonl(queryset, columns), content_type='application/x-ndjson')
+    stamp = timezone.localdate().strftime('%Y%m%d')
+    response['Content-Disposition'] = f'attachment; filename="{dataset}_{stamp}.{export_format}"'
+    return response
+
 @login_required
 def invoice_detail(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
     
-    # Generate QR code for payment
-    qr_data = f"Invoice: {invoice.invoice_number}\nAmount: KES {invoice.total_amount}\nDue: {invoice.due_date.strftime('%Y-%m-%d')}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    qr_img.save(buffer, format='PNG')
-    qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
+    # QR code for payment, rendered once per payload and served from the media cache
+    qr_format = request.GET.get('qr')
+    if qr_format not in qr_cache.QR_FORMATS:
+        qr_format = None
+    qr_code_url = qr_cache.get_qr_code_url(qr_cache.invoice_qr_payload(invoice), qr_format)
     
     context = {
         'invoice': invoice,
-        'qr_code': qr_code_base64,
+        'qr_code_url': qr_code_url,
     }
     
     return render(request, 'billing/invoice_detail.html', context)
@@ -171,88 +290,81 @@ def add_payment(request, invoice_id):
 
 @login_required
 def generate_receipt(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id)
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receipt_{invoice.invoice_number}.pdf"'
-    
-    # Create PDF
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Header
-    story.append(Paragraph("SUPERMARKET RECEIPT", styles['Title']))
-    story.append(Spacer(1, 12))
-    
-    # Invoice details
-    invoice_data = [
-        ['Invoice Number:', invoice.invoice_number],
-        ['Date:', invoice.created_at.strftime('%Y-%m-%d %H:%M')],
-        ['Customer:', invoice.customer.name if invoice.customer else 'Walk-in Customer'],
-        ['Staff:', invoice.staff_member.get_full_name()],
-    ]
-    
-    invoice_table = Table(invoice_data, colWidths=[2*72, 4*72])
-    invoice_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(invoice_table)
-    story.append(Spacer(1, 12))
-    
-    # Items
-    items_data = [['Description', 'Qty', 'Unit Price', 'Total']]
-    for item in invoice.items.all():
-        items_data.append([
-            item.description,
-            str(item.quantity),
-            f'KES {item.unit_price}',
-            f'KES {item.total_price}'
-        ])
-    
-    items_table = Table(items_data, colWidths=[3*72, 1*72, 1.5*72, 1.5*72])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(items_table)
-    story.append(Spacer(1, 12))
-    
-    # Totals
-    totals_data = [
-        ['Subtotal:', f'KES {invoice.subtotal}'],
-        ['Tax ({invoice.tax_rate}%):', f'KES {invoice.tax_amount}'],
-        ['Discount:', f'KES {invoice.discount_amount}'],
-        ['Total:', f'KES {invoice.total_amount}'],
-        ['Paid:', f'KES {invoice.paid_amount}'],
-        ['Balance:', f'KES {invoice.total_amount - invoice.paid_amount}'],
-    ]
-    
-    totals_table = Table(totals_data, colWidths=[4*72, 2*72])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -2), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(totals_table)
-    
-    doc.build(story)
+    invoice = get_object_or_404(Invoice.objects.select_related('customer', 'staff_member'), id=invoice_id)
+    
+    # ?format=text or ?format=escpos for 80mm thermal printers; PDF otherwise
+    receipt_format = request.GET.get('format', 'pdf')
+    if receipt_format in ('text', 'escpos'):
+        escpos = receipt_format == 'escpos'
+        body = receipts.render_thermal_receipt(
+            invoice, invoice.items.all(), invoice.payments.all(), escpos=escpos,
+        )
+        if escpos:
+            response = HttpResponse(body, content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="receipt_{invoice.invoice_number}.bin"'
+        else:
+            response = HttpResponse(body, content_type='text/plain; charset=utf-8')
+        return response
+    
+    # Receipts are rendered once per invoice version and reprinted from the cache
+    path, version = receipts.get_receipt_pdf(invoice)
+    etag = f'"{version}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f'receipt_{invoice.invoice_number}.pdf',
+            content_type='application/pdf',
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
+CUSTOMER_SEARCH_LIMIT = 20
+CUSTOMER_SEARCH_TTL = 30  # seconds
+
+
+def _customer_prefix_filter(customers, query):
+    """Phone-looking queries hit the normalized phone index, anything else the lowercased name."""
+    compact = query.replace(' ', '').replace('-', '').lstrip('+')
+    if compact.isdigit():
+        return customers.filter(phone_normalized__startswith=normalize_phone(compact)).order_by('phone_normalized')
+    return customers.filter(name_lower__startswith=query.lower()).order_by('name_lower')
+
+@login_required
+def customer_search(request):
+    """JSON autocomplete for the till's customer picker; results are cached briefly."""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+    
+    # Keys carry a version that Customer.save bumps, so new customers show up at once
+    version = cache_version(CUSTOMER_SEARCH_VERSION_KEY)
+    key = 'billing:customer_search:%s:%s' % (version, hashlib.md5(query.lower().encode()).hexdigest())
+    results = cache.get(key)
+    if results is None:
+        customers = _customer_prefix_filter(Customer.objects.only('id', 'name', 'phone'), query)
+        results = [
+            {'id': c.id, 'name': c.name, 'phone': c.phone}
+            for c in customers[:CUSTOMER_SEARCH_LIMIT]
+        ]
+        cache.set(key, results, CUSTOMER_SEARCH_TTL)
+    return JsonResponse({'results': results})
+
 @login_required
 def customer_list(request):
-    customers = Customer.objects.all()
-    return render(request, 'billing/customer_list.html', {'customers': customers})
+    query = request.GET.get('q', '').strip()
+    customers = Customer.objects.order_by('name_lower', 'id')
+    if query:
+        customers = _customer_prefix_filter(customers, query)
+    page_obj = Paginator(customers, 50).get_page(request.GET.get('page'))
+    return render(request, 'billing/customer_list.html', {
+        'customers': page_obj,
+        'page_obj': page_obj,
+        'q': query,
+    })
 
 @login_required
 def create_customer(request):
@@ -267,10 +379,92 @@ def create_customer(request):
     
     return render(request, 'billing/create_customer.html', {'form': form})
 
+SALES_REPORT_GROUPS = {
+    'product': ('product_id', 'sku', 'product__name'),
+    'category': ('product__category_id', 'product__category__name'),
+}
+
+@login_required
+def sales_report(request):
+    """Revenue, cost and margin per product or category from the product-linked invoice lines."""
+    group = request.GET.get('group', 'product')
+    if group not in SALES_REPORT_GROUPS:
+        group = 'product'
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    
+    # Cancelled invoices sold nothing
+    lines = _filter_invoices(
+        InvoiceItem.objects.filter(product__isnull=False).exclude(invoice__payment_status='cancelled'),
+        None, start_date, end_date, prefix='invoice__',
+    )
+    cost = ExpressionWrapper(F('quantity') * F('cost_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    rows = list(
+        lines.order_by()
+        .values(*SALES_REPORT_GROUPS[group])
+        .annotate(units_sold=Sum('quantity'), revenue=Sum('total_price'), cost=Sum(cost))
+        .order_by('-revenue')
+    )
+    for row in rows:
+        row['name'] = row.get('product__name') or row.get('product__category__name')
+        row['cost'] = row['cost'] or Decimal('0.00')
+        row['margin'] = row['revenue'] - row['cost']
+        row['margin_pct'] = (row['margin'] / row['revenue'] * 100) if row['revenue'] else None
+    
+    context = {
+        'rows': rows,
+        'group': group,
+        'start_date': start_date,
+        'end_date': end_date,
+        'totals': {
+            'revenue': sum((r['revenue'] for r in rows), Decimal('0.00')),
+            'cost': sum((r['cost'] for r in rows), Decimal('0.00')),
+        },
+    }
+    return render(request, 'billing/sales_report.html', context)
+
+AGING_BUCKETS = ('current', 'days_1_30', 'days_31_60', 'days_61_90', 'days_over_90')
+
+
+def _aging_report(receivables, now):
+    """Open balances per customer split into age buckets by one grouped, conditional SUM."""
+    d30, d60, d90 = (now - timedelta(days=n) for n in (30, 60, 90))
+    rows = list(
+        receivables.order_by()
+        .values('customer_id', 'customer__name')
+        .annotate(
+            current=Sum('amount_due', filter=Q(due_date__gte=now)),
+            days_1_30=Sum('amount_due', filter=Q(due_date__lt=now, due_date__gte=d30)),
+            days_31_60=Sum('amount_due', filter=Q(due_date__lt=d30, due_date__gte=d60)),
+            days_61_90=Sum('amount_due', filter=Q(due_date__lt=d60, due_date__gte=d90)),
+            days_over_90=Sum('amount_due', filter=Q(due_date__lt=d90)),
+            total=Sum('amount_due'),
+        )
+        .order_by('-total')
+    )
+    totals = dict.fromkeys(AGING_BUCKETS + ('total',), Decimal('0.00'))
+    for row in rows:
+        for key in totals:
+            row[key] = row[key] or Decimal('0.00')
+            totals[key] += row[key]
+    return rows, totals
+
 @login_required
 def accounts_receivable_view(request):
     receivables = AccountsReceivable.objects.filter(is_settled=False)
-    return render(request, 'billing/accounts_receivable.html', {'receivables': receivables})
+    aging, aging_totals = _aging_report(receivables, timezone.now())
+    
+    page_obj = Paginator(
+        receivables.select_related('customer', 'invoice').order_by('due_date', 'id'), 50,
+    ).get_page(request.GET.get('page'))
+    
+    context = {
+        'receivables': page_obj,
+        'page_obj': page_obj,
+        'aging': aging,
+        'aging_totals': aging_totals,
+    }
+    return render(request, 'billing/accounts_receivable.html', context)
 
 @login_required
 def accounts_payable_view(request):
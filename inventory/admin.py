@@ -1,5 +1,48 @@
+import json
+from django import forms
 from django.contrib import admin
-from .models import Category, Product
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import BaseModelFormSet
+from django.utils import timezone
+from django.utils.html import format_html
+from supermarket.pagination import EstimatedCountPaginator
+from .models import Category, Product, StockMovement
+from . import barcodes, prices, search, stock, valuation
+
+class LoadedRowChoiceField(forms.ModelChoiceField):
+    """A formset row's id field, resolved from the rows the formset has already loaded."""
+    
+    def __init__(self, formset, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formset = formset
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = self.queryset.model._meta.pk.to_python(value)
+        except ValidationError:
+            pk = None
+        obj = self.formset._existing_object(pk) if pk is not None else None
+        if obj is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return obj
+
+class ChangeListFormSet(BaseModelFormSet):
+    """list_editable formset without a SELECT per row to validate each row's id."""
+    
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields.get(name)
+        if isinstance(field, forms.ModelChoiceField):
+            # The edited rows are fetched in one query (the formset's queryset), so look ids up there
+            form.fields[name] = LoadedRowChoiceField(
+                self, field.queryset, initial=field.initial, required=False, widget=field.widget,
+            )
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,13 +51,153 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'sku', 'unit_price', 'quantity_in_stock', 'is_low_stock', 'is_active')
-    list_filter = ('category', 'is_active', 'created_at')
+    list_display = ('thumbnail', 'name', 'category', 'sku', 'unit_price', 'quantity_in_stock', 'reserved_quantity', 'is_low_stock', 'is_active')
+    list_filter = ('category', 'is_active', 'is_low_stock', 'created_at')
     search_fields = ('name', 'sku', 'barcode')
-    readonly_fields = ('created_at', 'updated_at')
-    list_editable = ('unit_price', 'quantity_in_stock', 'is_active')
+    readonly_fields = ('reserved_quantity', 'created_at', 'updated_at')
+    # Stock is changed through StockMovement, never edited in place
+    list_editable = ('unit_price', 'is_active')
+    list_select_related = ('category',)
+    # Total order matching product_name_id_idx; otherwise the admin appends -pk and sorts every row
+    ordering = ('name', 'id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['activate_products', 'deactivate_products']
+    
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', ChangeListFormSet)
+        return super().get_changelist_formset(request, **kwargs)
+    
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST' or '_save' not in request.POST:
+            return super().changelist_view(request, extra_context)
+        # list_editable save: save_model and log_change only collect the rows,
+        # which are then written with one bulk_update and one LogEntry insert.
+        request._list_edits = ([], [])
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            products, entries = request._list_edits
+            if products:
+                now = timezone.now()
+                for product in products:
+                    product.updated_at = now
+                Product.objects.bulk_update(products, [*self.list_editable, 'updated_at'], batch_size=500)
+                self._after_bulk_write({product.barcode for product in products})
+            if entries:
+                LogEntry.objects.bulk_create(entries)
+        return response
+    
+    def log_change(self, request, obj, message):
+        edits = getattr(request, '_list_edits', None)
+        if edits is None:
+            return super().log_change(request, obj, message)
+        entry = LogEntry(
+            user_id=request.user.pk,
+            content_type_id=ContentType.objects.get_for_model(obj, for_concrete_model=False).pk,
+            object_id=str(obj.pk),
+            object_repr=str(obj)[:200],
+            action_flag=CHANGE,
+            change_message=json.dumps(message) if isinstance(message, list) else message,
+        )
+        edits[1].append(entry)
+        return entry
+    
+    def _after_bulk_write(self, stale_barcodes):
+        # Bulk writes bypass Product.save; do its cache invalidation once the rows are visible
+        transaction.on_commit(lambda: barcodes.invalidate(*stale_barcodes))
+        transaction.on_commit(prices.bump_version)
+        transaction.on_commit(valuation.invalidate)
+    
+    @transaction.atomic
+    def _set_active(self, request, queryset, active):
+        changing = queryset.exclude(is_active=active)
+        stale_barcodes = set(changing.exclude(barcode='').values_list('barcode', flat=True))
+        updated = changing.update(is_active=active, updated_at=timezone.now())
+        if updated:
+            self._after_bulk_write(stale_barcodes)
+        self.message_user(request, f"{'Activated' if active else 'Deactivated'} {updated} product(s).")
+    
+    def activate_products(self, request, queryset):
+        self._set_active(request, queryset, True)
+    activate_products.short_description = 'Activate selected products'
+    
+    def deactivate_products(self, request, queryset):
+        self._set_active(request, queryset, False)
+    deactivate_products.short_description = 'Deactivate selected products'
+    
+    def thumbnail(self, obj):
+        thumb = obj.thumbnail('sm')
+        if not thumb:
+            return ''
+        return format_html('<img src="{}" width="{}" height="{}" alt="" loading="lazy">', thumb['jpeg'], thumb['width'] // 2, thumb['height'] // 2)
+    thumbnail.short_description = ''
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of icontains scans over search_fields
+        return search.filter_queryset(queryset, search_term), False
+    
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.readonly_fields + ('quantity_in_stock',)
+        return self.readonly_fields
+    
+    def save_model(self, request, obj, form, change):
+        edits = getattr(request, '_list_edits', None)
+        if change and edits is not None:
+            edits[0].append(obj)
+            return
+        opening = 0
+        if not change:
+            # A new product's starting stock goes in as a ledger entry like any other
+            opening, obj.quantity_in_stock = obj.quantity_in_stock, 0
+        super().save_model(request, obj, form, change)
+        if opening:
+            stock.record_movement(obj, StockMovement.ADJUSTMENT, opening, reference='Opening balance', user=request.user)
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ('product', 'movement_type', 'quantity', 'reference')
+        help_texts = {
+            'quantity': 'Units counted for sales, receipts and returns; signed change for adjustments.',
+        }
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        movement_type = cleaned_data.get('movement_type')
+        quantity = cleaned_data.get('quantity')
+        if movement_type and quantity is not None:
+            try:
+                stock.signed_quantity(movement_type, quantity)
+            except ValueError as exc:
+                raise forms.ValidationError({'quantity': str(exc)})
+            if not quantity:
+                raise forms.ValidationError({'quantity': 'Quantity cannot be zero.'})
+        return cleaned_data
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    form = StockMovementForm
+    list_display = ('created_at', 'product', 'movement_type', 'quantity', 'reference', 'created_by')
+    list_filter = ('movement_type', 'created_at')
+    search_fields = ('product__name', 'product__sku', 'reference')
+    list_select_related = ('product', 'created_by')
+    raw_id_fields = ('product',)
+    # No date_hierarchy: its DISTINCT over every movement's date grows with the ledger;
+    # the created_at filter covers the same ground.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def has_change_permission(self, request, obj=None):
+        # The ledger is append-only; corrections are new adjustment rows
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
     
-    def is_low_stock(self, obj):
-        return obj.is_low_stock
-    is_low_stock.boolean = True
-    is_low_stock.short_description = 'Low Stock'
+    def save_model(self, request, obj, form, change):
+        movement = stock.record_movement(
+            obj.product, obj.movement_type, obj.quantity, reference=obj.reference, user=request.user,
+        )
+        obj.pk = movement.pk
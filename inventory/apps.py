@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+def _ensure_search_index(sender, using, **kwargs):
+    from . import search
+    
+    search.ensure_index(using)
+
+class InventoryConfig(AppConfig):
+    name = 'inventory'
+    
+    def ready(self):
+        # SQLite table rebuilds during migrations drop the product search triggers
+        post_migrate.connect(_ensure_search_index, sender=self)
@@ -0,0 +1,116 @@
+"""Barcode lookups for the tills: in-process LRU, then the shared cache, then product.barcode."""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+SHARED_KEY_PREFIX = 'inventory:barcode:'
+
+# Cached in place of a payload for unknown codes, so repeated misses skip the database
+_MISSING = 'missing'
+
+_lock = threading.Lock()
+# barcode -> (expires at, payload or _MISSING)
+_lru = OrderedDict()
+
+
+def normalize_barcode(raw):
+    return (raw or '').strip()
+
+
+def _lru_size():
+    return max(0, int(getattr(settings, 'BARCODE_LRU_SIZE', 10000)))
+
+
+def _lru_ttl():
+    return float(getattr(settings, 'BARCODE_LRU_TTL', 30))
+
+
+def _shared_ttl():
+    return int(getattr(settings, 'BARCODE_CACHE_TTL', 300))
+
+
+def _shared_key(barcode):
+    return f'{SHARED_KEY_PREFIX}{barcode}'
+
+
+def _lru_get(barcode):
+    with _lock:
+        entry = _lru.get(barcode)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _lru[barcode]
+            return None
+        _lru.move_to_end(barcode)
+        return entry[1]
+
+
+def _lru_put(barcode, value):
+    size = _lru_size()
+    if not size:
+        return
+    with _lock:
+        _lru[barcode] = (time.monotonic() + _lru_ttl(), value)
+        _lru.move_to_end(barcode)
+        while len(_lru) > size:
+            _lru.popitem(last=False)
+
+
+def product_payload(product):
+    """Fields a till needs for a scanned item; stock is left out, checkout never calls Product.save."""
+    return {
+        'id': product.pk,
+        'sku': product.sku,
+        'barcode': product.barcode,
+        'name': product.name,
+        'unit_price': str(product.unit_price),
+    }
+
+
+def _load(barcode):
+    from .models import Product
+
+    product = (
+        Product.objects.filter(barcode=barcode, is_active=True)
+        .only('id', 'sku', 'barcode', 'name', 'unit_price')
+        .order_by('id')
+        .first()
+    )
+    return product_payload(product) if product is not None else None
+
+
+def resolve_barcode(raw):
+    """Return the payload of the active product with this barcode, or None."""
+    barcode = normalize_barcode(raw)
+    if not barcode:
+        return None
+
+    value = _lru_get(barcode)
+    if value is None:
+        value = cache.get(_shared_key(barcode))
+        if value is None:
+            payload = _load(barcode)
+            value = payload if payload is not None else _MISSING
+            cache.set(_shared_key(barcode), value, _shared_ttl())
+        _lru_put(barcode, value)
+    return None if value == _MISSING else value
+
+
+def invalidate(*barcodes):
+    """Evict codes from this process's LRU and the shared cache; other LRUs expire after BARCODE_LRU_TTL."""
+    codes = {normalize_barcode(code) for code in barcodes} - {''}
+    if not codes:
+        return
+    with _lock:
+        for code in codes:
+            _lru.pop(code, None)
+    cache.delete_many([_shared_key(code) for code in codes])
+
+
+def clear_local_cache():
+    with _lock:
+        _lru.clear()
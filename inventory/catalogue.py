@@ -0,0 +1,255 @@
+"""Streaming CSV catalogue import: products are upserted by SKU in batches of bulk writes."""
+
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import barcodes, prices, valuation
+from .models import Category, Product, StockMovement, low_stock_expression
+
+CATALOGUE_COLUMNS = (
+    'sku', 'name', 'category', 'barcode', 'description', 'unit_price',
+    'cost_price', 'minimum_stock_level', 'is_active', 'quantity_in_stock',
+)
+
+# Product fields a catalogue row may change, keyed by CSV column.
+_FIELDS = {
+    'name': 'name',
+    'category': 'category_id',
+    'barcode': 'barcode',
+    'description': 'description',
+    'unit_price': 'unit_price',
+    'cost_price': 'cost_price',
+    'minimum_stock_level': 'minimum_stock_level',
+    'is_active': 'is_active',
+}
+_REQUIRED_FOR_NEW = ('name', 'category', 'unit_price', 'cost_price')
+
+DEFAULT_BATCH_SIZE = 2000
+# bulk_update emits one CASE per field per row; smaller statements keep it fast.
+UPDATE_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+
+_TRUE = {'1', 'true', 'yes', 'y', 'active'}
+_FALSE = {'0', 'false', 'no', 'n', 'inactive'}
+
+
+class CatalogueImportError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.categories_created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+    def summary(self):
+        prefix = 'Dry run: would have ' if self.dry_run else ''
+        return (
+            f'{prefix}{self.created} created, {self.updated} updated, {self.unchanged} unchanged, '
+            f'{self.skipped} skipped, {self.categories_created} new categories '
+            f'({self.rows} rows in {self.elapsed:.1f}s, {self.rows_per_second:,.0f} rows/s)'
+        )
+
+
+def _decimal(value, column):
+    try:
+        result = Decimal(value.replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'{column} must be a number')
+    if not result.is_finite() or result < 0:
+        raise ValueError(f'{column} must be a non-negative number')
+    return result
+
+
+def _integer(value, column):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{column} must be a whole number')
+
+
+def _parse_row(row):
+    """Return (sku, {column: parsed value}) for the non-blank cells of a row."""
+    cells = {k: (v or '').strip() for k, v in row.items() if k in CATALOGUE_COLUMNS and (v or '').strip()}
+    sku = cells.pop('sku', '')
+    if not sku:
+        raise ValueError('sku is required')
+    if len(sku) > 50:
+        raise ValueError('sku is longer than 50 characters')
+
+    values = {}
+    for column, raw in cells.items():
+        if column in ('unit_price', 'cost_price'):
+            values[column] = _decimal(raw, column)
+        elif column in ('minimum_stock_level', 'quantity_in_stock'):
+            values[column] = _integer(raw, column)
+        elif column == 'is_active':
+            if raw.lower() not in _TRUE | _FALSE:
+                raise ValueError('is_active must be yes/no')
+            values[column] = raw.lower() in _TRUE
+        elif column == 'barcode':
+            values[column] = barcodes.normalize_barcode(raw)[:100]
+        elif column == 'name':
+            values[column] = raw[:200]
+        elif column == 'category':
+            values[column] = raw[:100]
+        else:
+            values[column] = raw
+    return sku, values
+
+
+class _Importer:
+    # Per batch: one SELECT of existing SKUs, one bulk_create, one bulk_update and, for category
+    # names not seen before, one bulk insert. Blank cells keep the current value; stock is only
+    # read for new products, as an opening-balance ledger entry.
+    def __init__(self, report, batch_size, user=None):
+        self.report = report
+        self.batch_size = max(1, batch_size)
+        self.user = user
+        self.categories = {}
+
+    def _resolve_categories(self, names):
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        self.categories.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        new = missing - self.categories.keys()
+        if not new:
+            return
+        self.report.categories_created += len(new)
+        if self.report.dry_run:
+            self.categories.update(dict.fromkeys(new))
+            return
+        Category.objects.bulk_create([Category(name=name) for name in new], ignore_conflicts=True)
+        self.categories.update(Category.objects.filter(name__in=new).values_list('name', 'id'))
+
+    def apply(self, batch):
+        self._resolve_categories({values['category'] for _line, values in batch.values() if 'category' in values})
+        existing = {p.sku: p for p in Product.objects.filter(sku__in=batch)}
+
+        now = timezone.now()
+        to_create = []
+        openings = {}
+        to_update = []
+        update_fields = set()
+        threshold_changed = []
+        stale_barcodes = set()
+
+        for sku, (line, values) in batch.items():
+            fields = {
+                _FIELDS[column]: (self.categories[value] if column == 'category' else value)
+                for column, value in values.items()
+                if column in _FIELDS
+            }
+            product = existing.get(sku)
+            if product is None:
+                missing = [column for column in _REQUIRED_FOR_NEW if column not in values]
+                if missing:
+                    self.report.error(line, f"new SKU {sku} needs {', '.join(missing)}")
+                    continue
+                quantity = values.get('quantity_in_stock', 0)
+                product = Product(sku=sku, **fields)
+                product.quantity_in_stock = quantity
+                product.is_low_stock = quantity <= product.minimum_stock_level
+                to_create.append(product)
+                if quantity:
+                    openings[sku] = quantity
+                continue
+
+            changed = [name for name, value in fields.items() if getattr(product, name) != value]
+            if not changed:
+                self.report.unchanged += 1
+                continue
+            stale_barcodes.update((product.barcode, fields.get('barcode', product.barcode)))
+            if 'minimum_stock_level' in changed:
+                threshold_changed.append(product.pk)
+            for name in changed:
+                setattr(product, name, fields[name])
+            product.updated_at = now
+            update_fields.update(changed)
+            to_update.append(product)
+
+        self.report.created += len(to_create)
+        self.report.updated += len(to_update)
+        if self.report.dry_run:
+            return
+
+        with transaction.atomic():
+            if to_create:
+                Product.objects.bulk_create(to_create)
+            if openings:
+                ids = dict(Product.objects.filter(sku__in=openings).values_list('sku', 'id'))
+                StockMovement.objects.bulk_create([
+                    StockMovement(
+                        product_id=ids[sku],
+                        movement_type=StockMovement.ADJUSTMENT,
+                        quantity=quantity,
+                        reference='Opening balance (catalogue import)',
+                        created_by=self.user,
+                    )
+                    for sku, quantity in openings.items()
+                ])
+            if to_update:
+                Product.objects.bulk_update(
+                    to_update, sorted(update_fields | {'updated_at'}), batch_size=UPDATE_BATCH_SIZE,
+                )
+            if threshold_changed:
+                Product.objects.filter(pk__in=threshold_changed).update(is_low_stock=low_stock_expression())
+            # bulk writes skip Product.save, so evict scanner cache entries here
+            stale_barcodes.update(p.barcode for p in to_create)
+            transaction.on_commit(lambda: barcodes.invalidate(*stale_barcodes))
+            if to_create or update_fields & set(prices.TABLE_FIELDS):
+                transaction.on_commit(prices.bump_version)
+            if to_create or to_update:
+                transaction.on_commit(valuation.invalidate)
+
+
+def import_catalogue(lines, *, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, user=None):
+    """Upsert products by SKU from CSV lines; each batch commits alone, so a failed import can be re-run."""
+    started = time.monotonic()
+    reader = csv.DictReader(lines)
+    header = {(name or '').strip() for name in reader.fieldnames or ()}
+    if 'sku' not in header:
+        raise CatalogueImportError('The CSV header must include a sku column.')
+    reader.fieldnames = [(name or '').strip() for name in reader.fieldnames]
+
+    report = ImportReport(dry_run=dry_run)
+    importer = _Importer(report, batch_size, user=user)
+    batch = {}
+    for row in reader:
+        report.rows += 1
+        try:
+            sku, values = _parse_row(row)
+        except ValueError as exc:
+            report.error(reader.line_num, str(exc))
+            continue
+        # A later row for the same SKU wins, as it would across batches
+        batch[sku] = (reader.line_num, values)
+        if len(batch) >= importer.batch_size:
+            importer.apply(batch)
+            batch = {}
+    if batch:
+        importer.apply(batch)
+
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,19 @@
+from django import forms
+
+class CatalogueImportForm(forms.Form):
+    file = forms.FileField(
+        label='Catalogue CSV',
+        help_text='Columns: sku, name, category, barcode, description, unit_price, cost_price, '
+                  'minimum_stock_level, is_active, quantity_in_stock. Only sku is required for existing products.',
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Dry run',
+        help_text='Validate and count changes without writing anything.',
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['file'].widget.attrs.update({'class': 'form-control', 'accept': '.csv,text/csv'})
+        self.fields['dry_run'].widget.attrs.update({'class': 'form-check-input'})
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import thumbnails
+from inventory.models import Product
+
+
+def _generate(product_id, image_name):
+    try:
+        return thumbnails.generate(product_id, image_name), None
+    except Exception as exc:
+        return False, exc
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        'Render missing or stale product thumbnails. Safe to stop and re-run: products whose '
+        'thumbnails match their current image are skipped, and --after-id resumes from a printed position.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-id', type=int, default=0, help='Only products with a larger id (resume point).')
+        parser.add_argument('--batch-size', type=int, default=200, help='Products read per query (default: 200).')
+        parser.add_argument('--workers', type=int, default=4, help='Images rendered in parallel (default: 4).')
+        parser.add_argument('--force', action='store_true', help='Re-render even when thumbnails look current.')
+
+    def handle(self, *args, **options):
+        last_id = options['after_id']
+        batch_size = max(1, options['batch_size'])
+        rendered = failed = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            while True:
+                batch = list(
+                    Product.objects.filter(pk__gt=last_id).exclude(image='').exclude(image__isnull=True)
+                    .order_by('pk').values_list('pk', 'image', 'thumbnails')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                todo = [
+                    (pk, image) for pk, image, thumbs in batch
+                    if options['force'] or not thumbnails.is_current(thumbs, image)
+                ]
+                for (pk, image), (ok, error) in zip(todo, pool.map(lambda job: _generate(*job), todo)):
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f'Product {pk} ({image}): {error}')
+                    elif ok:
+                        rendered += 1
+                self.stdout.write(f'... up to product id {last_id}: {rendered} rendered, {failed} failed')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered thumbnails for {rendered} products in {time.monotonic() - started:.1f}s ({failed} failed).'
+        ))
@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory import barcodes
+from inventory.models import Category, Product
+from supermarket.benchmarks import latency_summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure barcode scan latency for the database, shared-cache and in-process LRU tiers '
+        'against a synthetic catalogue. Seeded rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Synthetic SKUs to seed (default: 100000).')
+        parser.add_argument('--lookups', type=int, default=5000, help='Scans timed per tier (default: 5000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the scan sample.')
+
+    def handle(self, *args, **options):
+        count = options['products']
+        rng = random.Random(options['seed'])
+        codes = [f'BENCH{n:09d}' for n in range(count)]
+        sample = [rng.choice(codes) for _ in range(options['lookups'])]
+
+        with transaction.atomic():
+            category = Category.objects.create(name=f'Barcode benchmark {time.time_ns()}')
+            started = time.monotonic()
+            Product.objects.bulk_create(
+                (
+                    Product(
+                        name=f'Benchmark item {n}',
+                        category=category,
+                        sku=f'BENCH-{n}',
+                        barcode=code,
+                        unit_price='10.00',
+                        cost_price='6.00',
+                    )
+                    for n, code in enumerate(codes)
+                ),
+                batch_size=5000,
+            )
+            self.stdout.write(f'Seeded {count} products in {time.monotonic() - started:.1f}s')
+
+            try:
+                results = {tier: self._time(sample, tier) for tier in ('database', 'shared cache', 'local LRU')}
+            finally:
+                barcodes.invalidate(*set(sample))
+                transaction.set_rollback(True)
+
+        for tier, samples in results.items():
+            self.stdout.write(f'{tier:>12}: {latency_summary(samples)}')
+
+    def _time(self, sample, tier):
+        timings = []
+        for code in sample:
+            # Put the code in exactly the tier being measured, whatever the caches' capacity
+            if tier == 'database':
+                barcodes.invalidate(code)
+            else:
+                barcodes.resolve_barcode(code)
+                if tier == 'shared cache':
+                    barcodes.clear_local_cache()
+            started = time.perf_counter()
+            if barcodes.resolve_barcode(code) is None:
+                raise RuntimeError(f'Seeded barcode {code} did not resolve.')
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
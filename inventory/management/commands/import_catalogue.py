@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.catalogue import DEFAULT_BATCH_SIZE, CatalogueImportError, import_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Upsert products by SKU from a supplier catalogue CSV, streaming it in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import, or '-' to read standard input.")
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows looked up and written per transaction (default: {DEFAULT_BATCH_SIZE}).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count changes without writing.')
+        parser.add_argument('--encoding', default='utf-8-sig', help='File encoding (default: utf-8-sig).')
+
+    def handle(self, *args, **options):
+        try:
+            if options['path'] == '-':
+                report = self._import(sys.stdin, options)
+            else:
+                with open(options['path'], encoding=options['encoding'], newline='') as fh:
+                    report = self._import(fh, options)
+        except (OSError, CatalogueImportError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(error)
+        if report.skipped > len(report.errors):
+            self.stderr.write(f'... and {report.skipped - len(report.errors)} more rows skipped')
+        self.stdout.write(self.style.SUCCESS(report.summary()))
+
+    def _import(self, lines, options):
+        return import_catalogue(lines, batch_size=options['batch_size'], dry_run=options['dry_run'])
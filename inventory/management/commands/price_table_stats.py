@@ -0,0 +1,28 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from inventory import prices
+
+
+class Command(BaseCommand):
+    help = 'Load the checkout price table and report its size, load time and memory per 100k SKUs.'
+
+    def handle(self, *args, **options):
+        tracemalloc.start()
+        started = time.monotonic()
+        table = prices.load()
+        elapsed = time.monotonic() - started
+        allocated, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        count = len(table)
+        estimated = table.nbytes()
+        self.stdout.write(f'Version {table.version}: {count} active products loaded in {elapsed:.2f}s')
+        self.stdout.write(f'Memory: {allocated / 2**20:.1f} MiB allocated, {estimated / 2**20:.1f} MiB by sys.getsizeof')
+        if count:
+            per_100k = allocated / count * 100_000
+            self.stdout.write(self.style.SUCCESS(
+                f'{per_100k / 2**20:.1f} MiB per 100k SKUs ({allocated / count:.0f} bytes per product).'
+            ))
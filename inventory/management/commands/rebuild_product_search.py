@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the product full-text index and its triggers if missing, and re-sync it from the product table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default: "default").')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        search.rebuild(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Product search index rebuilt in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from inventory import valuation
+from inventory.models import Product, StockMovement, StockSnapshot, low_stock_expression
+
+
+def _expected_on_hand():
+    """Latest snapshot plus the ledger tail after it, per product, as one SQL expression."""
+    latest = StockSnapshot.objects.filter(product=OuterRef('pk')).order_by('-last_movement_id')
+    latest_position = StockSnapshot.objects.filter(
+        product=OuterRef(OuterRef('pk')),
+    ).order_by('-last_movement_id').values('last_movement_id')[:1]
+    tail = (
+        StockMovement.objects.filter(
+            product=OuterRef('pk'),
+            id__gt=Coalesce(Subquery(latest_position), Value(0)),
+        )
+        .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    return (
+        Coalesce(Subquery(latest.values('quantity')[:1]), Value(0))
+        + Coalesce(Subquery(tail, output_field=IntegerField()), Value(0))
+    )
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product.quantity_in_stock from the latest StockSnapshot plus later StockMovements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report products whose stored quantity differs from the ledger.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Products rewritten per UPDATE (default: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Product.objects.annotate(expected=_expected_on_hand())
+            .exclude(quantity_in_stock=F('expected'))
+            .values_list('id', 'sku', 'quantity_in_stock', 'expected')
+        )
+        for _pk, sku, stored, expected in drifted[:20]:
+            self.stdout.write(f'{sku}: stored {stored}, ledger {expected}')
+        if len(drifted) > 20:
+            self.stdout.write(f'... and {len(drifted) - 20} more')
+
+        if options['dry_run'] or not drifted:
+            self.stdout.write(f'{len(drifted)} products differ from the ledger.')
+            return
+
+        ids = [row[0] for row in drifted]
+        batch_size = max(1, options['batch_size'])
+        for start in range(0, len(ids), batch_size):
+            # Computed inside the UPDATE itself, so a sale committing meanwhile is not lost
+            batch = Product.objects.filter(pk__in=ids[start:start + batch_size])
+            batch.update(quantity_in_stock=_expected_on_hand())
+            batch.update(is_low_stock=low_stock_expression())
+        valuation.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stock levels for {len(drifted)} products.'))
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from inventory import stock as stock_ledger
+from inventory.models import Product, StockMovement, StockSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Record every product\'s on-hand quantity at the current ledger position, '
+        'rolled forward from the previous snapshot (run periodically, e.g. nightly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=60,
+            help='Ignore movements newer than this so in-flight checkouts cannot commit behind the snapshot (default: 60).',
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=7,
+            help='Snapshot runs to keep; older ones are deleted (default: 7).',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['settle_seconds'])
+        position = StockMovement.objects.filter(created_at__lte=cutoff).aggregate(pos=Max('id'))['pos']
+        if position is None:
+            self.stdout.write('No settled stock movements yet; nothing to snapshot.')
+            return
+
+        previous_position = StockSnapshot.objects.aggregate(pos=Max('last_movement_id'))['pos'] or 0
+        if previous_position >= position:
+            self.stdout.write(f'Latest snapshot is already at ledger position {previous_position}.')
+            return
+
+        base = dict(
+            StockSnapshot.objects.filter(last_movement_id=previous_position)
+            .values_list('product_id', 'quantity')
+        )
+        totals = stock_ledger.ledger_totals(after=previous_position, upto=position)
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        # Products added since the previous run have no base row; roll them up from the start
+        unseen = [pk for pk in product_ids if pk not in base]
+        if previous_position and unseen:
+            for pk, total in stock_ledger.ledger_totals(unseen, upto=previous_position).items():
+                base[pk] = total
+
+        snapshots = [
+            StockSnapshot(
+                product_id=pk,
+                quantity=base.get(pk, 0) + totals.get(pk, 0),
+                last_movement_id=position,
+            )
+            for pk in product_ids
+        ]
+        with transaction.atomic():
+            StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+            kept = list(
+                StockSnapshot.objects.order_by('-last_movement_id')
+                .values_list('last_movement_id', flat=True).distinct()[:max(1, options['keep'])]
+            )
+            pruned, _ = StockSnapshot.objects.filter(last_movement_id__lt=min(kept)).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshotted {len(snapshots)} products at ledger position {position} ({pruned} old rows pruned).'
+        ))
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_opening_balances(apps, schema_editor):
+    """Seed the ledger with each product's current stock so it sums to quantity_in_stock."""
+    Product = apps.get_model('inventory', 'Product')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        (
+            StockMovement(
+                product_id=pk,
+                movement_type='adjustment',
+                quantity=quantity,
+                reference='Opening balance',
+            )
+            for pk, quantity in Product.objects.exclude(quantity_in_stock=0).values_list('id', 'quantity_in_stock').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0002_product_barcode_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('last_movement_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.product')),
+            ],
+            options={
+                'db_table': 'stock_snapshot',
+                'ordering': ['-last_movement_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('sale', 'Sale'), ('receipt', 'Receipt'), ('adjustment', 'Adjustment'), ('return', 'Return')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Signed change in on-hand stock')),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+            ],
+            options={
+                'db_table': 'stock_movement',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('product', 'last_movement_id'), name='stock_snapshot_position_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'id'], name='stock_movement_product_idx'),
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+def backfill_low_stock(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Product.objects.filter(quantity_in_stock__lte=models.F('minimum_stock_level')).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_low_stock', 'is_active', 'name'], name='product_low_stock_idx'),
+        ),
+        migrations.RunPython(backfill_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_product_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name'], name='product_active_name_idx'),
+        ),
+    ]
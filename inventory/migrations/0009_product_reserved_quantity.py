@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_product_name_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_quantity',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,7 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import LessThanOrEqual
 from django.utils import timezone
 from accounts.models import CustomUser
 
+from . import barcodes, prices, thumbnails, valuation
+
+
+def low_stock_expression(quantity=None, reserved=None):
+    """
+    SQL for Product.is_low_stock: available stock (on hand less reserved) at or
+    below the reorder level. Pass the quantity or reservation being written when
+    the flag is set in the same UPDATE, so it never reads the old column.
+    """
+    quantity = F('quantity_in_stock') if quantity is None else quantity
+    reserved = F('reserved_quantity') if reserved is None else reserved
+    return Case(
+        When(LessThanOrEqual(quantity - reserved, F('minimum_stock_level')), then=Value(True)),
+        default=Value(False),
+        output_field=models.BooleanField(),
+    )
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -14,27 +33,120 @@ class Category(models.Model):
         db_table = 'category'
         verbose_name_plural = 'Categories'
 
+class ProductQuerySet(models.QuerySet):
+    # filter(flag=True) compiles to a bare boolean column on SQLite and MySQL,
+    # which their planners will not match against an index; compare explicitly.
+    
+    def active(self):
+        """Active products, served from product_active_name_idx in name order."""
+        return self.filter(is_active=Value(True))
+    
+    def low_stock(self):
+        """Active products at or below their reorder level, served from product_low_stock_idx."""
+        return self.filter(is_low_stock=Value(True), is_active=Value(True))
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     sku = models.CharField(max_length=50, unique=True)
-    barcode = models.CharField(max_length=100, blank=True)
+    barcode = models.CharField(max_length=100, blank=True, db_index=True)
     description = models.TextField(blank=True)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_in_stock = models.IntegerField(default=0)
+    # Units held by open invoices (inventory.reservations); available = quantity_in_stock - reserved_quantity
+    reserved_quantity = models.IntegerField(default=0, editable=False)
     minimum_stock_level = models.IntegerField(default=10)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # {'source': image name, '<size>': {'jpeg': url, 'webp': url, 'width': px, 'height': px}}, filled by inventory.thumbnails
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
+    # Stored so the dashboard and reorder queue read an index instead of comparing two columns per row
+    is_low_stock = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_barcode = instance.__dict__.get('barcode')
+        instance._loaded_minimum_stock_level = instance.__dict__.get('minimum_stock_level')
+        instance._loaded_image = instance.__dict__.get('image')  # the raw column value, a name string
+        instance._loaded_prices = instance._price_fields()
+        return instance
+    
+    def _price_fields(self):
+        return tuple(self.__dict__.get(name) for name in prices.TABLE_FIELDS)
+    
+    def save(self, *args, **kwargs):
+        self.barcode = barcodes.normalize_barcode(self.barcode)
+        adding = self._state.adding
+        image_name = self.image.name if 'image' in self.__dict__ and self.image else ''
+        image_changed = 'image' in self.__dict__ and image_name != (getattr(self, '_loaded_image', None) or '')
+        if image_changed:
+            self.thumbnails = {}
+        if adding:
+            self.is_low_stock = self.available_quantity <= self.minimum_stock_level
+        elif kwargs.get('update_fields') is None:
+            # On-hand and reserved stock (and the flag derived from them) only move
+            # through the ledger's and reservations' F() updates, and thumbnails are written
+            # by a background worker; writing back the copies loaded here would undo them.
+            deferred = self.get_deferred_fields()
+            kept = {'quantity_in_stock', 'reserved_quantity', 'is_low_stock'} | (set() if image_changed else {'thumbnails'})
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in kept and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+        
+        if image_changed and self.image:
+            # The stored name (after upload_to and de-duplication) is only known now
+            pk, stored_name = self.pk, self.image.name
+            transaction.on_commit(lambda: thumbnails.schedule(pk, stored_name))
+        if 'image' in self.__dict__:
+            self._loaded_image = self.image.name if self.image else ''
+        
+        written = set(kwargs.get('update_fields') or ())
+        threshold_changed = (
+            'minimum_stock_level' in written
+            and self.minimum_stock_level != getattr(self, '_loaded_minimum_stock_level', None)
+        )
+        if not adding and ('quantity_in_stock' in written or threshold_changed):
+            Product.objects.filter(pk=self.pk).update(is_low_stock=low_stock_expression())
+            self.refresh_from_db(fields=['is_low_stock'])
+        self._loaded_minimum_stock_level = self.minimum_stock_level
+        # Scanners resolve through a cache; drop the old and new code once the row is visible
+        stale = (getattr(self, '_loaded_barcode', None), self.barcode)
+        transaction.on_commit(lambda: barcodes.invalidate(*stale))
+        self._loaded_barcode = self.barcode
+        # Checkout prices from a per-process table; make every worker reload it
+        if self._price_fields() != getattr(self, '_loaded_prices', None):
+            transaction.on_commit(prices.bump_version)
+            self._loaded_prices = self._price_fields()
+        transaction.on_commit(valuation.invalidate)
+    
+    def delete(self, *args, **kwargs):
+        stale = (getattr(self, '_loaded_barcode', None), self.barcode)
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: barcodes.invalidate(*stale))
+        transaction.on_commit(prices.bump_version)
+        transaction.on_commit(valuation.invalidate)
+        return result
+    
+    def thumbnail(self, size):
+        """URLs for one thumbnail size, or None until the worker has rendered the current image."""
+        if not self.image or not thumbnails.is_current(self.thumbnails, self.image.name):
+            return None
+        return self.thumbnails.get(size)
+    
     @property
-    def is_low_stock(self):
-        return self.quantity_in_stock <= self.minimum_stock_level
+    def available_quantity(self):
+        return self.quantity_in_stock - self.reserved_quantity
     
     @property
     def profit_margin(self):
@@ -45,3 +157,62 @@ class Product(models.Model):
     class Meta:
         db_table = 'product'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active', 'name'], name='product_active_name_idx'),
+            models.Index(fields=['is_low_stock', 'is_active', 'name'], name='product_low_stock_idx'),
+            # The admin changelist's (name, id) order, read straight off the index
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ]
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Rows are written through ``inventory.stock``,
+    which applies each movement to Product.quantity_in_stock with an F() UPDATE.
+    """
+    SALE = 'sale'
+    RECEIPT = 'receipt'
+    ADJUSTMENT = 'adjustment'
+    RETURN = 'return'
+    MOVEMENT_TYPE_CHOICES = [
+        (SALE, 'Sale'),
+        (RECEIPT, 'Receipt'),
+        (ADJUSTMENT, 'Adjustment'),
+        (RETURN, 'Return'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements', db_index=False)  # covered by stock_movement_product_idx
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES)
+    quantity = models.IntegerField(help_text='Signed change in on-hand stock')
+    reference = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.product} {self.quantity:+d} ({self.get_movement_type_display()})"
+    
+    class Meta:
+        db_table = 'stock_movement'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['product', 'id'], name='stock_movement_product_idx'),
+        ]
+
+class StockSnapshot(models.Model):
+    """
+    On-hand quantity of a product as of ledger position ``last_movement_id``.
+    Written by `snapshot_stock`; `rebuild_stock_levels` adds only the movements after it.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.product} = {self.quantity} @ {self.last_movement_id}"
+    
+    class Meta:
+        db_table = 'stock_snapshot'
+        ordering = ['-last_movement_id']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'last_movement_id'], name='stock_snapshot_position_uniq'),
+        ]
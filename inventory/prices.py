@@ -0,0 +1,170 @@
+"""Process-local price table for checkout, reloaded when the version in the shared cache changes."""
+
+import logging
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+
+from supermarket.cache import bump_cache_version, cache_version
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'inventory:price_table_version'
+
+# Product fields copied into the table; a change to any of them bumps the version.
+TABLE_FIELDS = ('sku', 'barcode', 'name', 'unit_price', 'cost_price', 'is_active')
+
+LOAD_CHUNK_SIZE = 5000
+
+_lock = threading.Lock()
+_table = None
+
+
+PriceEntry = namedtuple('PriceEntry', 'product_id sku name unit_price cost_price')
+
+
+def _cents(value):
+    return int(value.scaleb(2).to_integral_value())
+
+
+def _decimal(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+class PriceTable:
+    # Parallel array('q') columns with prices in cents, rather than a model instance or dict per
+    # product; price_table_stats reports the memory per 100k SKUs
+    __slots__ = ('version', 'loaded_at', '_by_sku', '_by_barcode', '_ids', '_unit', '_cost', '_skus', '_names')
+
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._by_sku = {}
+        self._by_barcode = {}
+        self._ids = array('q')
+        self._unit = array('q')
+        self._cost = array('q')
+        self._skus = []
+        self._names = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, product_id, sku, barcode, name, unit_price, cost_price):
+        # Columns first, then the index entries, so a concurrent reader never sees a row number that is not there yet
+        row = len(self._ids)
+        self._ids.append(product_id)
+        self._unit.append(_cents(unit_price))
+        self._cost.append(_cents(cost_price))
+        self._skus.append(sku)
+        self._names.append(name)
+        self._by_sku[sku] = row
+        if barcode:
+            # Rows are loaded in id order; the oldest product keeps a shared barcode, as barcode scans do
+            self._by_barcode.setdefault(barcode, row)
+
+    def _entry(self, row):
+        if row is None:
+            return None
+        return PriceEntry(self._ids[row], self._skus[row], self._names[row], _decimal(self._unit[row]), _decimal(self._cost[row]))
+
+    def by_sku(self, sku):
+        return self._entry(self._by_sku.get(sku))
+
+    def by_barcode(self, barcode):
+        return self._entry(self._by_barcode.get(barcode))
+
+    def nbytes(self):
+        """Approximate memory held by the table: containers plus the strings they own."""
+        total = sys.getsizeof(self)
+        for column in (self._ids, self._unit, self._cost, self._skus, self._names, self._by_sku, self._by_barcode):
+            total += sys.getsizeof(column)
+        # SKU strings are shared between _skus and _by_sku; barcodes only live in _by_barcode
+        total += sum(sys.getsizeof(s) for s in self._skus)
+        total += sum(sys.getsizeof(s) for s in self._names)
+        total += sum(sys.getsizeof(s) for s in self._by_barcode)
+        return total
+
+
+def _max_age():
+    return float(getattr(settings, 'PRICE_TABLE_MAX_AGE', 300))
+
+
+def current_version():
+    return cache_version(VERSION_KEY)
+
+
+def bump_version():
+    """Invalidate every worker's table; call once the price change is committed."""
+    bump_cache_version(VERSION_KEY)
+
+
+def _active_products():
+    from .models import Product
+
+    return Product.objects.active().order_by('pk')
+
+
+def load(version=None):
+    """Read every active product into a new table (streamed, never all rows at once)."""
+    version = current_version() if version is None else version
+    table = PriceTable(version)
+    rows = _active_products().values_list('id', *TABLE_FIELDS[:-1])
+    for row in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+        table.add(*row)
+    return table
+
+
+def current():
+    """This process's table, reloaded if the version moved on; take it once per basket."""
+    global _table
+    version = current_version()
+    table = _table
+    if table is not None and table.version == version and time.monotonic() - table.loaded_at < _max_age():
+        return table
+    with _lock:
+        table = _table
+        if table is None or table.version != version or time.monotonic() - table.loaded_at >= _max_age():
+            started = time.monotonic()
+            table = _table = load(version)
+            logger.info('Loaded price table v%s: %s products in %.2fs', version, len(table), time.monotonic() - started)
+        return table
+
+
+def warm():
+    """Load the table at worker start so the first checkout does not pay for it."""
+    try:
+        current()
+    except Exception:
+        logger.exception('Could not warm the price table; it will load on first use')
+
+
+def lookup(table, skus=(), barcodes=()):
+    """Return ({sku: entry}, {barcode: entry}), reading misses from the database in one query."""
+    skus, barcodes = set(skus), set(barcodes)
+    by_sku = {sku: entry for sku in skus if (entry := table.by_sku(sku)) is not None}
+    by_barcode = {code: entry for code in barcodes if (entry := table.by_barcode(code)) is not None}
+    missing_skus = skus - by_sku.keys()
+    missing_barcodes = barcodes - by_barcode.keys()
+    if not missing_skus and not missing_barcodes:
+        return by_sku, by_barcode
+
+    condition = Q(sku__in=missing_skus) | Q(barcode__in=missing_barcodes)
+    rows = list(_active_products().filter(condition).values_list('id', *TABLE_FIELDS[:-1]))
+    with _lock:
+        for row in rows:
+            _product_id, sku, barcode = row[:3]
+            if table.by_sku(sku) is None:
+                table.add(*row)
+            entry = table.by_sku(sku)
+            if sku in missing_skus:
+                by_sku[sku] = entry
+            if barcode in missing_barcodes and barcode not in by_barcode:
+                by_barcode[barcode] = entry
+    return by_sku, by_barcode
@@ -0,0 +1,65 @@
+"""Product.reserved_quantity, the running total of stock held by open invoices (see billing.reservations)."""
+
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .models import Product, low_stock_expression
+
+
+class InsufficientStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        detail = ', '.join(f'{p.sku} ({p.available_quantity} available)' for p in products)
+        super().__init__(f"Not enough available stock for {detail or 'this line'}.")
+
+
+def _change(deltas):
+    if len(deltas) == 1:
+        (delta,) = deltas.values()
+        return Value(delta)
+    return Case(*[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()], default=Value(0))
+
+
+def _update(products, deltas):
+    change = _change(deltas)
+    # Relative, like the stock ledger's UPDATEs. is_low_stock first, from the new reservation
+    # explicitly (MySQL assigns left to right)
+    return products.update(
+        is_low_stock=low_stock_expression(reserved=F('reserved_quantity') + change),
+        reserved_quantity=F('reserved_quantity') + change,
+    )
+
+
+def reserve(quantities, *, allow_oversell=False):
+    """Hold {product_id: units} with one UPDATE; raises InsufficientStock, holding nothing, if any is short."""
+    deltas = {pk: int(qty) for pk, qty in sorted(quantities.items()) if qty}
+    if not deltas:
+        return
+    products = Product.objects.filter(pk__in=deltas)
+    if allow_oversell:
+        _update(products, deltas)
+        return
+    # The check is part of the UPDATE, so two tills can never both take the last units
+    available = reduce(or_, (
+        Q(pk=pk, quantity_in_stock__gte=F('reserved_quantity') + Value(qty)) for pk, qty in deltas.items()
+    ))
+    with transaction.atomic():
+        if _update(products.filter(available), deltas) == len(deltas):
+            return
+        # Roll the partial UPDATE back, then report which products fell short
+        transaction.set_rollback(True)
+    short = [
+        p for p in Product.objects.filter(pk__in=deltas).only('sku', 'quantity_in_stock', 'reserved_quantity')
+        if p.available_quantity < deltas[p.pk]
+    ]
+    raise InsufficientStock(short)
+
+
+def release(quantities):
+    """Give back {product_id: units} previously reserved, with one UPDATE."""
+    deltas = {pk: -int(qty) for pk, qty in sorted(quantities.items()) if qty}
+    if deltas:
+        _update(Product.objects.filter(pk__in=deltas), deltas)
@@ -0,0 +1,155 @@
+"""Product search over name, SKU, barcode and description: FTS5 on SQLite, pg_trgm on PostgreSQL."""
+
+import re
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'product_search'
+_COLUMNS = ('name', 'sku', 'barcode', 'description')
+# bm25 column weights, in _COLUMNS order
+_WEIGHTS = (10.0, 6.0, 6.0, 1.0)
+
+# Keep the external-content FTS5 table in step with every write, including bulk and raw UPDATEs
+_TRIGGERS = {
+    f'{SEARCH_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON product BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, name, sku, barcode, description)
+            VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+        END""",
+    f'{SEARCH_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON product BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, sku, barcode, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+        END""",
+    # Only the indexed columns; stock and price UPDATEs do not touch the index
+    f'{SEARCH_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF name, sku, barcode, description ON product BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, sku, barcode, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+            INSERT INTO {SEARCH_TABLE}(rowid, name, sku, barcode, description)
+            VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+        END""",
+}
+
+_TRIGRAM_INDEXES = {
+    f'product_{column}_trgm_idx': f'CREATE INDEX IF NOT EXISTS product_{column}_trgm_idx '
+                                  f'ON product USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+    for column in _COLUMNS
+}
+
+# bm25 has to read every match to rank it. A query matching more products than
+# this (one common word) is returned in catalogue order instead; typing another
+# word narrows it back into ranked results.
+RANK_CANDIDATE_LIMIT = 1000
+
+_TERM = re.compile(r'\w[\w-]*', re.UNICODE)
+
+
+def _vendor(using):
+    return connections[using].vendor
+
+
+def ensure_index(using='default'):
+    """Create the search index and triggers if missing (table rebuilds drop triggers); True if anything was."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            tables = set(connection.introspection.table_names(cursor))
+            if 'product' not in tables:
+                return False
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'product'")
+            existing = {row[0] for row in cursor.fetchall()}
+            created = SEARCH_TABLE not in tables or not set(_TRIGGERS) <= existing
+            if not created:
+                return False
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+                f"{', '.join(_COLUMNS)}, content='product', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+            )
+            for sql in _TRIGGERS.values():
+                cursor.execute(sql)
+            # Writes made while a trigger was missing are not in the index
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+            return True
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'product'")
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [sql for name, sql in _TRIGRAM_INDEXES.items() if name not in existing]
+            if not missing:
+                return False
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for sql in missing:
+                cursor.execute(sql)
+            return True
+    return False
+
+
+def rebuild(using='default'):
+    """Recreate anything missing, then re-sync the whole index from product."""
+    if not ensure_index(using) and _vendor(using) == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def match_expression(query):
+    """FTS5 query requiring every term as a prefix; terms are quoted, so input cannot inject syntax."""
+    terms = _TERM.findall(query)
+    return ' '.join('"%s"*' % term.replace('"', '') for term in terms)
+
+
+def filter_queryset(queryset, query):
+    """Narrow a Product queryset to matches for query, unranked (admin search, counts)."""
+    query = query.strip()
+    if not query:
+        return queryset
+    if _vendor(queryset.db) == 'sqlite':
+        expression = match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', (expression,))
+        )
+    condition = Q()
+    for term in query.split():
+        condition &= Q(name__icontains=term) | Q(sku__icontains=term) | Q(barcode__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition)
+
+
+def search(query, *, limit, offset=0, queryset=None):
+    """One ranked page of active products matching query, loaded through queryset if given."""
+    from .models import Product
+
+    queryset = Product.objects.all() if queryset is None else queryset
+    query = query.strip()
+    if not query:
+        return []
+    if _vendor(queryset.db) != 'sqlite':
+        # Served by the pg_trgm indexes; name-prefix matches first
+        prefix = Case(When(name__istartswith=query, then=Value(0)), default=Value(1), output_field=IntegerField())
+        ranked = filter_queryset(queryset.active(), query).annotate(search_rank=prefix)
+        return list(ranked.order_by('search_rank', 'name', 'pk')[offset:offset + limit])
+
+    expression = match_expression(query)
+    if not expression:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT %s)',
+            (expression, RANK_CANDIDATE_LIMIT + 1),
+        )
+        if cursor.fetchone()[0] <= RANK_CANDIDATE_LIMIT:
+            order = f"bm25({SEARCH_TABLE}, {', '.join(str(w) for w in _WEIGHTS)}), p.id"
+        else:
+            order = f'{SEARCH_TABLE}.rowid'
+        cursor.execute(
+            f'SELECT p.id FROM {SEARCH_TABLE} JOIN product p ON p.id = {SEARCH_TABLE}.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND p.is_active ORDER BY {order} LIMIT %s OFFSET %s',
+            (expression, limit, offset),
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
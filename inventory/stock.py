@@ -0,0 +1,93 @@
+"""Stock ledger writes: StockMovement rows plus relative quantity_in_stock UPDATEs."""
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from . import valuation
+from .models import Product, StockMovement, low_stock_expression
+
+# Sales take stock off the shelf, receipts and returns put it back; adjustments carry their own sign.
+_DIRECTION = {
+    StockMovement.SALE: -1,
+    StockMovement.RECEIPT: 1,
+    StockMovement.RETURN: 1,
+}
+
+
+def signed_quantity(movement_type, quantity):
+    """Turn a counted quantity into the signed change it makes to on-hand stock."""
+    quantity = int(quantity)
+    if movement_type == StockMovement.ADJUSTMENT:
+        return quantity
+    if movement_type not in _DIRECTION:
+        raise ValueError(f'Unknown stock movement type: {movement_type}')
+    if quantity <= 0:
+        raise ValueError(f'{movement_type.capitalize()} quantities must be positive.')
+    return _DIRECTION[movement_type] * quantity
+
+
+def record_movements(movement_type, quantities, *, reference='', user=None):
+    """Record one movement per product ({product_id: quantity}) and apply them with one UPDATE."""
+    # Products are updated in primary-key order, so concurrent tills take row locks in the same order
+    deltas = {
+        pk: signed_quantity(movement_type, qty)
+        for pk, qty in sorted(quantities.items())
+        if qty or movement_type != StockMovement.ADJUSTMENT
+    }
+    if not deltas:
+        return []
+
+    movements = [
+        StockMovement(
+            product_id=pk,
+            movement_type=movement_type,
+            quantity=delta,
+            reference=reference[:100],
+            created_by=user,
+        )
+        for pk, delta in deltas.items()
+    ]
+    with transaction.atomic():
+        StockMovement.objects.bulk_create(movements)
+        _apply(deltas)
+        transaction.on_commit(valuation.invalidate)
+    return movements
+
+
+def record_movement(product, movement_type, quantity, *, reference='', user=None):
+    """Single-product form of record_movements; refreshes the product's stock fields."""
+    movements = record_movements(movement_type, {product.pk: quantity}, reference=reference, user=user)
+    product.refresh_from_db(fields=['quantity_in_stock', 'is_low_stock'])
+    return movements[0] if movements else None
+
+
+def _apply(deltas):
+    # Relative UPDATE: concurrent sales of the same product never overwrite each other's decrements
+    if len(deltas) == 1:
+        (pk, delta), = deltas.items()
+        change = Value(delta)
+        products = Product.objects.filter(pk=pk)
+    else:
+        change = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+        )
+        products = Product.objects.filter(pk__in=deltas)
+    # is_low_stock comes first and is computed from the new quantity explicitly:
+    # MySQL evaluates SET assignments left to right against already-updated columns.
+    products.update(
+        is_low_stock=low_stock_expression(F('quantity_in_stock') + change),
+        quantity_in_stock=F('quantity_in_stock') + change,
+    )
+
+
+def ledger_totals(product_ids=None, *, after=0, upto=None):
+    """Sum of movement quantities per product for ledger ids in (after, upto]."""
+    movements = StockMovement.objects.filter(id__gt=after)
+    if upto is not None:
+        movements = movements.filter(id__lte=upto)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=list(product_ids))
+    return dict(
+        movements.order_by().values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
@@ -0,0 +1,13 @@
+from django import template
+
+register = template.Library()
+
+@register.filter
+def thumbnail(product, size):
+    """{{ product|thumbnail:'md' }}: the size's jpeg/webp URLs and dimensions, or None."""
+    return product.thumbnail(size)
+
+@register.inclusion_tag('inventory/_product_thumbnail.html')
+def product_thumbnail(product, size='md'):
+    """A <picture> with WebP and JPEG sources; the original upload is only used until thumbnails exist."""
+    return {'product': product, 'thumb': product.thumbnail(size), 'size': size}
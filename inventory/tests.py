@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from .models import Category, Product
+from .reservations import InsufficientStock, release, reserve
+
+
+class ProductAdminListEditableTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Pantry')
+        self.products = [
+            Product.objects.create(
+                name=f'Item {n:02d}', category=category, sku=f'ITEM-{n}',
+                unit_price=Decimal('1.00'), cost_price=Decimal('0.50'),
+            )
+            for n in range(12)
+        ]
+
+    def post_prices(self, pks, price):
+        data = {
+            'form-TOTAL_FORMS': str(len(pks)),
+            'form-INITIAL_FORMS': str(len(pks)),
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+            '_save': 'Save',
+        }
+        for index, pk in enumerate(pks):
+            data[f'form-{index}-id'] = str(pk)
+            data[f'form-{index}-unit_price'] = price
+            data[f'form-{index}-is_active'] = 'on'
+        return self.client.post(reverse('admin:inventory_product_changelist'), data)
+
+    def count_queries(self, pks, price):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_prices(pks, price)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_edited_rows(self):
+        pks = [product.pk for product in self.products]
+        # The first save also fills the content type cache
+        self.count_queries(pks[:1], '1.50')
+        few = self.count_queries(pks[:2], '2.00')
+        many = self.count_queries(pks, '3.00')
+
+        self.assertEqual(few, many)
+        self.assertEqual(set(Product.objects.values_list('unit_price', flat=True)), {Decimal('3.00')})
+
+    def test_unknown_row_id_is_rejected(self):
+        response = self.post_prices([max(product.pk for product in self.products) + 1], '9.00')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Product.objects.filter(unit_price=Decimal('9.00')).exists())
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(
+            name='Milk', category=category, sku='MLK', unit_price=Decimal('1.00'),
+            cost_price=Decimal('0.60'), quantity_in_stock=5,
+        )
+        self.eggs = Product.objects.create(
+            name='Eggs', category=category, sku='EGG', unit_price=Decimal('2.00'),
+            cost_price=Decimal('1.20'), quantity_in_stock=2,
+        )
+
+    def reserved(self):
+        return dict(Product.objects.values_list('sku', 'reserved_quantity'))
+
+    def test_short_product_holds_nothing(self):
+        reserve({self.milk.pk: 1})
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve({self.milk.pk: 4, self.eggs.pk: 3})
+
+        self.assertEqual([p.sku for p in raised.exception.products], ['EGG'])
+        self.assertEqual(self.reserved(), {'MLK': 1, 'EGG': 0})
+
+    def test_last_units_can_be_held_once(self):
+        reserve({self.eggs.pk: 2})
+        with self.assertRaises(InsufficientStock):
+            reserve({self.eggs.pk: 1})
+        release({self.eggs.pk: 2})
+        reserve({self.eggs.pk: 1})
+        self.assertEqual(self.reserved()['EGG'], 1)
+
+    def test_oversell_is_allowed_when_asked(self):
+        reserve({self.eggs.pk: 3}, allow_oversell=True)
+        self.assertEqual(self.reserved()['EGG'], 3)
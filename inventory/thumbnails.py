@@ -0,0 +1,130 @@
+"""Product thumbnails (JPEG and WebP per size in PRODUCT_THUMBNAIL_SIZES), rendered off the request thread."""
+
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'products/thumbs'
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_sizes():
+    """{name: longest edge in px}"""
+    return dict(getattr(settings, 'PRODUCT_THUMBNAIL_SIZES', {'sm': 96, 'md': 320}))
+
+
+def is_current(thumbnails, image_name):
+    thumbnails = thumbnails or {}
+    return bool(image_name) and thumbnails.get('source') == image_name and all(
+        name in thumbnails for name in thumbnail_sizes()
+    )
+
+
+def _stem(image_name):
+    # Keyed by source name so a re-upload never reuses another image's files
+    return hashlib.sha1(image_name.encode('utf-8')).hexdigest()[:12]
+
+
+def render_thumbnails(product_id, image_name):
+    """Write every size and format for image_name and return the URL map."""
+    from PIL import Image, ImageOps
+
+    with default_storage.open(image_name, 'rb') as fh:
+        with Image.open(fh) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+            original.load()
+
+    stem = _stem(image_name)
+    thumbnails = {'source': image_name}
+    for name, edge in thumbnail_sizes().items():
+        image = original.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        urls = {}
+        for fmt, ext, options in (
+            ('JPEG', 'jpg', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}),
+            ('WEBP', 'webp', {'quality': WEBP_QUALITY, 'method': 4}),
+        ):
+            frame = image.convert('RGB') if fmt == 'JPEG' and image.mode != 'RGB' else image
+            buffer = io.BytesIO()
+            frame.save(buffer, fmt, **options)
+            path = f'{THUMBNAIL_DIR}/{product_id}/{stem}_{name}.{ext}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            saved = default_storage.save(path, ContentFile(buffer.getvalue()))
+            urls['jpeg' if fmt == 'JPEG' else 'webp'] = default_storage.url(saved)
+        urls['width'], urls['height'] = image.size
+        thumbnails[name] = urls
+    return thumbnails
+
+
+def generate(product_id, image_name):
+    """Build and store thumbnails for one product; False if its image changed while rendering."""
+    from .models import Product
+
+    thumbnails = render_thumbnails(product_id, image_name)
+    # Conditional on the image still being the one rendered, so a stale worker loses the race
+    if not Product.objects.filter(pk=product_id, image=image_name).update(thumbnails=thumbnails):
+        return False
+    _delete_other_versions(product_id, image_name)
+    return True
+
+
+def _delete_other_versions(product_id, image_name):
+    directory = f'{THUMBNAIL_DIR}/{product_id}'
+    stem = _stem(image_name)
+    try:
+        _dirs, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        if not name.startswith(f'{stem}_'):
+            default_storage.delete(f'{directory}/{name}')
+
+
+def _run(product_id, image_name):
+    close_old_connections()
+    try:
+        generate(product_id, image_name)
+    except Exception:
+        logger.exception('Thumbnail generation failed for product %s (%s)', product_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, int(getattr(settings, 'THUMBNAIL_WORKERS', 2))),
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def schedule(product_id, image_name):
+    """Queue thumbnail generation; runs inline when THUMBNAIL_WORKERS is 0."""
+    if not image_name:
+        return
+    if int(getattr(settings, 'THUMBNAIL_WORKERS', 2)) <= 0:
+        try:
+            generate(product_id, image_name)
+        except Exception:
+            logger.exception('Thumbnail generation failed for product %s (%s)', product_id, image_name)
+        return
+    _pool().submit(_run, product_id, image_name)
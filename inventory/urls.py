@@ -4,5 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.inventory_dashboard, name='inventory_dashboard'),
     path('products/', views.product_list, name='product_list'),
+    path('products/search/', views.product_search, name='product_search'),
+    path('products/scan/<str:barcode>/', views.product_scan, name='product_scan'),
+    path('products/import/', views.catalogue_import, name='catalogue_import'),
+    path('reorder/', views.reorder_queue, name='reorder_queue'),
     path('categories/', views.category_list, name='category_list'),
+    path('valuation/', views.inventory_valuation, name='inventory_valuation'),
 ]
@@ -0,0 +1,85 @@
+"""Inventory valuation by category (stock at cost, at retail, and the stock-weighted margin), cached per version."""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from supermarket.cache import bump_cache_version, cache_version
+
+VERSION_KEY = 'inventory:valuation_version'
+REPORT_KEY_PREFIX = 'inventory:valuation:'
+
+CSV_COLUMNS = (
+    ('category', 'name'),
+    ('products', 'product_count'),
+    ('units_in_stock', 'units_in_stock'),
+    ('cost_value', 'cost_value'),
+    ('retail_value', 'retail_value'),
+    ('margin_value', 'margin_value'),
+    ('margin_pct', 'margin_pct'),
+)
+
+_ZERO = Decimal('0.00')
+
+
+def _ttl():
+    return int(getattr(settings, 'INVENTORY_VALUATION_CACHE_TTL', 900))
+
+
+def invalidate():
+    """Drop every cached report; call once the stock or price change is committed."""
+    bump_cache_version(VERSION_KEY)
+
+
+def _margin_pct(margin, retail):
+    return (margin / retail * 100).quantize(Decimal('0.01')) if retail else None
+
+
+def compute():
+    """Run the grouped query and return {'rows', 'totals', 'generated_at'}."""
+    from .models import Product
+
+    # Oversold (negative) stock is a data problem, not negative value; leave it out of the sums
+    on_hand = Q(quantity_in_stock__gt=0)
+    value = DecimalField(max_digits=18, decimal_places=2)
+    rows = list(
+        Product.objects.active()
+        .order_by()
+        .values('category_id', 'category__name')
+        .annotate(
+            product_count=Count('id'),
+            units_in_stock=Sum('quantity_in_stock', filter=on_hand),
+            cost_value=Sum(ExpressionWrapper(F('quantity_in_stock') * F('cost_price'), output_field=value), filter=on_hand),
+            retail_value=Sum(ExpressionWrapper(F('quantity_in_stock') * F('unit_price'), output_field=value), filter=on_hand),
+        )
+        .order_by('-cost_value', 'category__name')
+    )
+
+    totals = {'product_count': 0, 'units_in_stock': 0, 'cost_value': _ZERO, 'retail_value': _ZERO}
+    for row in rows:
+        row['name'] = row.pop('category__name')
+        row['units_in_stock'] = row['units_in_stock'] or 0
+        row['cost_value'] = Decimal(row['cost_value'] or 0).quantize(_ZERO)
+        row['retail_value'] = Decimal(row['retail_value'] or 0).quantize(_ZERO)
+        row['margin_value'] = row['retail_value'] - row['cost_value']
+        row['margin_pct'] = _margin_pct(row['margin_value'], row['retail_value'])
+        for key in totals:
+            totals[key] += row[key]
+    totals['margin_value'] = totals['retail_value'] - totals['cost_value']
+    totals['margin_pct'] = _margin_pct(totals['margin_value'], totals['retail_value'])
+    return {'rows': rows, 'totals': totals, 'generated_at': timezone.now()}
+
+
+def report():
+    """The current report, from the cache when nothing has changed since it was built."""
+    # INVENTORY_VALUATION_CACHE_TTL bounds its age should a write path (a raw UPDATE) miss invalidate()
+    version = cache_version(VERSION_KEY)
+    key = f'{REPORT_KEY_PREFIX}{version}'
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, _ttl())
+    return result
@@ -1,15 +1,22 @@
-from django.shortcuts import render
+import csv
+import io
+
+from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.db import models
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
 from .models import Product, Category
+from .forms import CatalogueImportForm
+from . import barcodes, search, valuation
+from .catalogue import CatalogueImportError, import_catalogue
 
 @login_required
 def inventory_dashboard(request):
-    total_products = Product.objects.filter(is_active=True).count()
-    low_stock_products = Product.objects.filter(
-        is_active=True,
-        quantity_in_stock__lte=models.F('minimum_stock_level')
-    ).count()
+    total_products = Product.objects.active().count()
+    low_stock_products = Product.objects.low_stock().count()
     
     context = {
         'total_products': total_products,
@@ -18,12 +25,157 @@ def inventory_dashboard(request):
     
     return render(request, 'inventory/dashboard.html', context)
 
+PRODUCT_PAGE_SIZE = 50
+
 @login_required
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    return render(request, 'inventory/product_list.html', {'products': products})
+    category_id = request.GET.get('category', '')
+    low_stock = request.GET.get('low_stock') == '1'
+    
+    products = Product.objects.low_stock() if low_stock else Product.objects.active()
+    if category_id.isdigit():
+        products = products.filter(category_id=category_id)
+    products = (
+        products.select_related('category')
+        .only(
+            'name', 'sku', 'unit_price', 'quantity_in_stock', 'reserved_quantity', 'is_low_stock',
+            'image', 'thumbnails', 'category__name',
+        )
+        .order_by('name', 'id')
+    )
+    page_obj = Paginator(products, PRODUCT_PAGE_SIZE).get_page(request.GET.get('page'))
+    
+    filter_query = request.GET.copy()
+    filter_query.pop('page', None)
+    return render(request, 'inventory/product_list.html', {
+        'products': page_obj,
+        'page_obj': page_obj,
+        'categories': Category.objects.only('id', 'name').order_by('name'),
+        'category_id': category_id,
+        'low_stock': low_stock,
+        'filter_query': filter_query.urlencode(),
+    })
+
+@login_required
+def reorder_queue(request):
+    products = (
+        Product.objects.low_stock()
+        .select_related('category')
+        .only('name', 'sku', 'quantity_in_stock', 'reserved_quantity', 'minimum_stock_level', 'category__name')
+        .annotate(shortfall=models.F('minimum_stock_level') - models.F('quantity_in_stock') + models.F('reserved_quantity'))
+        .order_by('name', 'id')
+    )
+    page_obj = Paginator(products, 50).get_page(request.GET.get('page'))
+    return render(request, 'inventory/reorder_queue.html', {
+        'products': page_obj,
+        'page_obj': page_obj,
+    })
 
 @login_required
 def category_list(request):
-    categories = Category.objects.all()
+    active = models.Q(product__is_active=True)
+    categories = Category.objects.annotate(
+        product_count=models.Count('product', filter=active),
+        low_stock_count=models.Count('product', filter=active & models.Q(product__is_low_stock=True)),
+        units_in_stock=models.Sum('product__quantity_in_stock', filter=active),
+        stock_value=models.Sum(
+            models.ExpressionWrapper(
+                models.F('product__quantity_in_stock') * models.F('product__cost_price'),
+                output_field=models.DecimalField(max_digits=16, decimal_places=2),
+            ),
+            filter=active,
+        ),
+    ).order_by('name')
     return render(request, 'inventory/category_list.html', {'categories': categories})
+
+@login_required
+def inventory_valuation(request):
+    """Stock value at cost and retail, and the stock-weighted margin, per category; ?format=csv to download."""
+    if request.user.role not in ['admin', 'manager']:
+        messages.error(request, 'Access denied!')
+        return redirect('inventory_dashboard')
+    
+    report = valuation.report()
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        stamp = timezone.localtime(report['generated_at']).strftime('%Y%m%d_%H%M')
+        response['Content-Disposition'] = f'attachment; filename="inventory_valuation_{stamp}.csv"'
+        writer = csv.writer(response)
+        writer.writerow([header for header, _key in valuation.CSV_COLUMNS])
+        for row in report['rows']:
+            writer.writerow([row[key] if row[key] is not None else '' for _header, key in valuation.CSV_COLUMNS])
+        totals = dict(report['totals'], name='Total')
+        writer.writerow([totals[key] if totals[key] is not None else '' for _header, key in valuation.CSV_COLUMNS])
+        return response
+    return render(request, 'inventory/valuation_report.html', report)
+
+PRODUCT_SEARCH_PAGE_SIZE = 20
+
+@login_required
+def product_search(request):
+    """Ranked product search for the till and back office; ?q=<text>&page=<n>."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    if not query:
+        return JsonResponse({'results': [], 'page': page, 'has_next': False})
+    
+    # One extra row tells us whether there is a next page without counting every match
+    products = search.search(
+        query,
+        limit=PRODUCT_SEARCH_PAGE_SIZE + 1,
+        offset=(page - 1) * PRODUCT_SEARCH_PAGE_SIZE,
+        queryset=Product.objects.select_related('category').only(
+            'name', 'sku', 'barcode', 'unit_price', 'quantity_in_stock', 'reserved_quantity', 'category__name',
+        ),
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'id': p.id,
+                'name': p.name,
+                'sku': p.sku,
+                'barcode': p.barcode,
+                'category': p.category.name,
+                'unit_price': str(p.unit_price),
+                'quantity_in_stock': p.quantity_in_stock,
+                'available_quantity': p.available_quantity,
+            }
+            for p in products[:PRODUCT_SEARCH_PAGE_SIZE]
+        ],
+        'page': page,
+        'has_next': len(products) > PRODUCT_SEARCH_PAGE_SIZE,
+    })
+
+@login_required
+def product_scan(request, barcode):
+    """Resolve a scanned barcode to the product the till should ring up."""
+    product = barcodes.resolve_barcode(barcode)
+    if product is None:
+        return JsonResponse({'error': 'No active product with this barcode.'}, status=404)
+    return JsonResponse(product)
+
+@login_required
+def catalogue_import(request):
+    if request.user.role not in ['admin', 'manager']:
+        messages.error(request, 'Access denied!')
+        return redirect('inventory_dashboard')
+    
+    report = None
+    if request.method == 'POST':
+        form = CatalogueImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Parse straight off the upload (a temp file for large catalogues) without reading it into memory
+            lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                report = import_catalogue(lines, dry_run=form.cleaned_data['dry_run'], user=request.user)
+            except (CatalogueImportError, UnicodeDecodeError) as exc:
+                form.add_error('file', str(exc))
+            else:
+                messages.success(request, report.summary())
+    else:
+        form = CatalogueImportForm()
+    
+    return render(request, 'inventory/catalogue_import.html', {'form': form, 'report': report})
@@ -0,0 +1,51 @@
+// Remote customer search for <select data-search-url> pickers (see billing.forms.CustomerSearchSelect).
+(function () {
+    function attach(select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-2';
+        input.placeholder = 'Search by name or phone…';
+        input.autocomplete = 'off';
+        select.parentNode.insertBefore(input, select);
+
+        var timer = null;
+        var controller = null;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            var q = input.value.trim();
+            if (q.length < 2) {
+                return;
+            }
+            timer = setTimeout(function () {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                fetch(select.dataset.searchUrl + '?q=' + encodeURIComponent(q), {
+                    credentials: 'same-origin',
+                    signal: controller.signal
+                })
+                    .then(function (resp) { return resp.json(); })
+                    .then(function (data) {
+                        var current = select.value;
+                        while (select.options.length > 1) {
+                            select.remove(1);
+                        }
+                        data.results.forEach(function (c) {
+                            var label = c.phone ? c.name + ' (' + c.phone + ')' : c.name;
+                            var option = new Option(label, c.id, false, String(c.id) === current);
+                            select.add(option);
+                        });
+                        if (data.results.length && !select.value) {
+                            select.selectedIndex = 1;
+                        }
+                    })
+                    .catch(function () {});
+            }, 200);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-search-url]').forEach(attach);
+    });
+})();
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supermarket.settings')
 
 application = get_asgi_application()
+
+# Load the checkout price table before the first request arrives
+from inventory import prices  # noqa: E402
+
+prices.warm()
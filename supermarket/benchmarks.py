@@ -0,0 +1,12 @@
+"""Latency summaries shared by the benchmark_* management commands."""
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    """p50, p99 and max of timings in milliseconds, as one line."""
+    return f'p50 {percentile(samples, 50):.3f} ms  p99 {percentile(samples, 99):.3f} ms  max {max(samples):.3f} ms'
@@ -0,0 +1,17 @@
+"""Version tokens in the shared cache that tell every worker when a cached value has gone stale."""
+
+import uuid
+
+from django.core.cache import cache
+
+
+def cache_version(key):
+    """The current token for key, to tag (or look up) whatever is cached from it."""
+    return cache.get_or_set(key, 1, None)
+
+
+def bump_cache_version(key):
+    """Move key on to a new token; call once the change behind it is committed."""
+    # A random token rather than cache.incr(): the database cache's incr is a read followed by a
+    # write, so two concurrent bumps could both store the same next value and one change go unseen
+    cache.set(key, uuid.uuid4().hex, None)
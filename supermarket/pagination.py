@@ -0,0 +1,62 @@
+"""Admin changelist paginator that avoids a full COUNT(*) on large tables."""
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def _threshold():
+    return int(getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000))
+
+
+def _count_limit():
+    return int(getattr(settings, 'ADMIN_COUNT_LIMIT', 100000))
+
+
+def estimated_row_count(model, using='default'):
+    """The planner's row estimate for model's table, or None when there is none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql, params = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s', [table]
+    elif connection.vendor == 'sqlite':
+        # The first number of any stat row is the table's row count at the last ANALYZE
+        sql, params = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        # e.g. sqlite_stat1 does not exist until the first ANALYZE
+        return None
+    if not row or row[0] is None:
+        return None
+    try:
+        estimate = int(str(row[0]).split()[0])
+    except ValueError:
+        return None
+    # reltuples is -1 for a table that was never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Unfiltered: the table statistics once past ADMIN_ESTIMATED_COUNT_THRESHOLD rows. Filtered: a
+    # count capped at ADMIN_COUNT_LIMIT. Pair with show_full_result_count = False, or the admin
+    # still runs an unfiltered COUNT(*) for the "n of N selected" label.
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > _threshold():
+                return estimate
+        limit = _count_limit()
+        # COUNT(*) over a LIMITed subquery: reads at most limit + 1 rows
+        return min(queryset.order_by()[:limit + 1].count(), limit)
@@ -104,9 +104,30 @@ DATABASES = {
     'default': {
         'ENGINE':'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # On disk rather than in memory, so threaded tests wait on each other's write locks
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Shared by every worker process: barcode scans, customer search results and the version counters
+# that tell workers to reload the price table or drop cached valuation reports. Set REDIS_URL to use
+# Redis; otherwise the database's cache table (create it with `python manage.py createcachetable`).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -134,6 +155,40 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Invoice QR codes are cached under MEDIA_ROOT/qr_cache/ ('png' or 'svg'; svg skips PIL)
+QR_CODE_FORMAT = config('QR_CODE_FORMAT', default='png')
+QR_CACHE_MAX_FILES = config('QR_CACHE_MAX_FILES', default=2000, cast=int)
+
+# Invoice numbers handed to each worker thread per reservation (INV-YYYYMMDD-NNNNNN)
+INVOICE_NUMBER_BLOCK_SIZE = config('INVOICE_NUMBER_BLOCK_SIZE', default=50, cast=int)
+
+# Barcode scans: per-process LRU in front of the shared cache (sizes in entries, TTLs in seconds);
+# other workers' LRUs only see a changed barcode after BARCODE_LRU_TTL
+BARCODE_LRU_SIZE = config('BARCODE_LRU_SIZE', default=10000, cast=int)
+BARCODE_LRU_TTL = config('BARCODE_LRU_TTL', default=30, cast=int)
+BARCODE_CACHE_TTL = config('BARCODE_CACHE_TTL', default=300, cast=int)
+
+# Product image thumbnails: {name: longest edge in px}, rendered by a per-process thread pool
+# (0 workers renders inline during the request)
+PRODUCT_THUMBNAIL_SIZES = {'sm': 96, 'md': 320}
+THUMBNAIL_WORKERS = config('THUMBNAIL_WORKERS', default=2, cast=int)
+
+# Checkout prices from a per-process table, reloaded when the shared version counter moves
+# and at least every PRICE_TABLE_MAX_AGE seconds
+PRICE_TABLE_MAX_AGE = config('PRICE_TABLE_MAX_AGE', default=300, cast=int)
+
+# Admin changelists on large tables (supermarket.pagination): unfiltered lists use the table
+# statistics' row estimate above the threshold, filtered lists count at most ADMIN_COUNT_LIMIT rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+ADMIN_COUNT_LIMIT = config('ADMIN_COUNT_LIMIT', default=100000, cast=int)
+
+# Inventory valuation report: cached until stock or prices change, and at most this many seconds
+INVENTORY_VALUATION_CACHE_TTL = config('INVENTORY_VALUATION_CACHE_TTL', default=900, cast=int)
+
+# Stock held by an unpaid invoice's lines is released this many seconds after the last line was added
+# (by the release_expired_reservations command; run it from cron every few minutes)
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=4 * 3600, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
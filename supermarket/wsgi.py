@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supermarket.settings')
 
 application = get_wsgi_application()
+
+# Load the checkout price table before the first request arrives
+from inventory import prices  # noqa: E402
+
+prices.warm()